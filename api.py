@@ -1,66 +1,596 @@
 #!/usr/bin/env python
+import asyncio
 import json
 import os
+import time
+from concurrent.futures import as_completed
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from types import SimpleNamespace
 
+import openai
+from openai import AsyncOpenAI
 from openai import OpenAI
+from utils.llm_cache import ResponseCache
+from utils.metrics import METRICS
+from utils.observation import estimate_tokens
+from utils.profiling import PROFILER
+from utils.resilience import RetryPolicy
+from utils.stream_json import IncrementalJsonChecker
+
+# Errors worth another attempt: timeouts, connection errors, rate limits and 5xx
+RETRYABLE_ERRORS = (
+    openai.APIConnectionError,  # Includes openai.APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError,
+    TimeoutError,
+)
 
 
 class LLMApi:
-    def __init__(self, config_path: str):
-        
+    MAX_OUTSTANDING_HEDGES = 2  # Losing hedge calls still running before hedging pauses
+
+    def __init__(self, config_path: str = "configapi.json", config: dict = None):
+        # config: the configapi.json content, used instead of reading config_path
+
         base_dir = os.path.dirname(os.path.abspath(__file__))
-        config_path = os.path.join(base_dir, config_path)
+        config_path = os.path.join(base_dir, config_path) if config is None else None
+        self._init_defaults()
         try:
-            with open(config_path, 'r') as config_file:
-                config = json.load(config_file)
-                self.client = OpenAI(base_url= config['api_client']['base_url'],
-                                     api_key= config['api_client']['api_key'])
-                self.model = config['api_model']['model']
-                self.api_extra_headers = config['api_extra_headers'].get('extra_headers', {})
+            if config is None:
+                with open(config_path) as config_file:
+                    config = json.load(config_file)
+            self.config = config
+            if "api_retry" in config:
+                self.retry = RetryPolicy(**config["api_retry"])
+            self.client = self._create_client(config["api_client"])
+            self.model = config["api_model"]["model"]
+            # Seconds per attempt, None: client default
+            self.timeout = config["api_client"].get("timeout")
+            # Stream replies, aborting malformed ones
+            self.stream = config["api_client"].get("stream", False)
+            self.api_extra_headers = config.get("api_extra_headers", {}).get(
+                "extra_headers", {}
+            )
+            if "api_cache" in config:
+                self.cache = ResponseCache(**config["api_cache"])
+            if "api_fallback" in config:
+                # Secondary model used once the primary one gave up, on the
+                # same client unless it has its own base_url/api_key
+                fallback = config["api_fallback"]
+                fallback_client_config = {**config["api_client"], **fallback}
+                self.fallback_model = fallback["model"]
+                self.fallback_client = self.client
+                if any(
+                    fallback_client_config[key] != config["api_client"][key]
+                    for key in ("base_url", "api_key")
+                ):
+                    self.fallback_client = self._create_client(
+                        fallback_client_config, "fallback"
+                    )
         except FileNotFoundError:
             print(f"Configuration file not found at {config_path}")
             return None
         except json.JSONDecodeError:
             print(f"Error decoding JSON from the configuration file at {config_path}")
-            return None 
+            return None
+
+    def _init_defaults(self):
+        """
+        Sets the attributes that don't depend on the configuration (also used
+        by backends that have none, like StubLLMApi).
+        """
+        self.config = {}
+        self.last_usage = None
+        self.cache = None
+        self.timeout = None
+        # No retries unless api_retry is configured
+        self.retry = RetryPolicy(max_retries=0)
+        self.fallback_client = None
+        self.fallback_model = None
+        self._hedge_pool = None
+        self._hedge_futures = set()  # Calls of the hedge pool that have not finished
+        self.stream = False
+        self.limiter = None  # Optional ProviderLimiter (utils/rate_limit.py)
+        # Sampling params sent with every request (also part of the cache key)
+        self.request_params = {"response_format": {"type": "json_object"}}
+
+    def _create_client(self, client_config: dict, role: str = "primary"):
+        return OpenAI(
+            base_url=client_config["base_url"],
+            api_key=client_config["api_key"],
+            **self._client_retry_params(),
+        )
+
+    def _client_retry_params(self) -> dict:
+        # The retry policy replaces the client's own retries when it is configured
+        return {"max_retries": 0} if "api_retry" in self.config else {}
+
+    def _targets(self):
+        """
+        Returns the (client, model) pairs to try in order: the primary model,
+        then the fallback one if configured.
+        """
+        targets = [(self.client, self.model)]
+        if self.fallback_model is not None:
+            targets.append((self.fallback_client, self.fallback_model))
+        return targets
 
     def setInitialContext(self, context: str):
         self.context = context
 
+        # The static part of the prompt is assembled once per episode and sent as
+        # a stable system message, so provider-side prefix caching can hit.
+        prefix = "<context>\n"
+        prefix += self.context
+        prefix += "\nFollow the bellow json to answer:\n"
+        prefix += json.dumps(self.getReturnJsonPattern(), indent=2)
+        prefix += "\n</context>\n"
+        self.system_message = {"role": "system", "content": prefix}
+
     def getReturnJsonPattern(self) -> dict:
         root = dict()
-        root["prev_reasoning"] = "this is your detailed analysis of what happened in previous turns. Explain what actions were taken, what results occurred, and what you learned from those outcomes. Include any patterns or cause-effect relationships you observed."
-        
-        root["key_action_map"] = "Analyze the key action map based on previous results. Reflect on how each button behaved in the past and form hypotheses about their effects. Update your understanding after each turn, refining your hypotheses as you gather more data. It's okay to be uncertain—just state it clearly. Evaluate all buttons, even those whose functions are still unknown. Feel free to press the same button multiple times to test for consistent behavior. If the observed outcome doesn't match your expectations, revise the key action map accordingly."
-        
-        root["next_reasoning"] = "this is your strategic thinking about what actions to take next. Based on your previous analysis and the key action map, explain your hypothesis about what each button might do and justify your choice for the next action. Include your goal and how this action might help achieve it."
-        
+        root["prev_reasoning"] = (
+            "this is your detailed analysis of what happened in previous turns. Explain what actions were taken, what results occurred, and what you learned from those outcomes. Include any patterns or cause-effect relationships you observed."
+        )
+
+        root["key_action_map"] = (
+            "Analyze the key action map based on previous results. Reflect on how each button behaved in the past and form hypotheses about their effects. Update your understanding after each turn, refining your hypotheses as you gather more data. It's okay to be uncertain—just state it clearly. Evaluate all buttons, even those whose functions are still unknown. Feel free to press the same button multiple times to test for consistent behavior. If the observed outcome doesn't match your expectations, revise the key action map accordingly."
+        )
+
+        root["next_reasoning"] = (
+            "this is your strategic thinking about what actions to take next. Based on your previous analysis and the key action map, explain your hypothesis about what each button might do and justify your choice for the next action. Include your goal and how this action might help achieve it."
+        )
+
         root["choice"] = "this your button choice"
-        
+
         return root
 
-    def generate(self, msg: dict):
-        self.payload = "<context>\n"
-        self.payload += self.context
-        self.payload += "\nFollow the bellow json to answer:\n"
-        self.payload += json.dumps(self.getReturnJsonPattern(), indent=2)
-        self.payload += "\n</context>\n"
-        self.payload += "<current_turn>\n"
-        self.payload += json.dumps(msg, indent=2)
+    @PROFILER.traced("llm.generate", "llm")
+    def generate(self, msg):
+        # msg is the JSON of the current turn, either already serialized or a dict
+        if not isinstance(msg, str):
+            msg = json.dumps(msg, ensure_ascii=False, separators=(",", ":"))
+
+        self.payload = "<current_turn>\n"
+        self.payload += msg
         self.payload += "\n</current_turn>\n"
+        self.messages = [self.system_message, {"role": "user", "content": self.payload}]
 
-    def request(self) -> str:
-        request = self.client.chat.completions.create(
-            model=self.model, 
-            messages=[{"role": "user", "content": self.payload}],
-            response_format={"type": "json_object"},
-            # reasoning_effort='low' || 'high' || 'medium'
+    def _cached(self):
+        """
+        Returns (cache key, cached reply) for the current messages; both are None
+        when there is no cache, and the reply is None when the API must be called.
+        """
+        if self.cache is None:
+            return None, None
+        key = self.cache.make_key(self.model, self.messages, self.request_params)
+        return key, self.cache.get(key)
+
+    def _timeout_params(self, timeout) -> dict:
+        timeout = timeout if timeout is not None else self.timeout
+        return {"timeout": timeout} if timeout is not None else {}
+
+    def _record_request(
+        self, started, reply=None, usage=None, error=None, model=None, messages=None
+    ):
+        """
+        Records the metrics of a finished request (see utils.metrics).
+
+        Args:
+            started (float): time.perf_counter() when the request was sent.
+            reply (str): The reply, None if the request failed.
+            usage: Token usage reported by the API, if any.
+            error (Exception): The error raised by the request, if any.
+            model (str): Model that was called. Defaults to the primary one.
+            messages (list): Messages that were sent. Defaults to the current ones.
+        """
+        model = model or self.model
+        payload = (messages or self.messages)[-1]["content"]
+        METRICS.observe(
+            "llm_request_seconds", time.perf_counter() - started, model=model
+        )
+        METRICS.observe("llm_payload_bytes", len(payload.encode("utf-8")), model=model)
+        if error is not None:
+            METRICS.inc(
+                "llm_request_errors_total", model=model, error=type(error).__name__
+            )
+            return
+
+        METRICS.inc("llm_requests_total", model=model)
+        METRICS.observe(
+            "llm_reply_bytes", len((reply or "").encode("utf-8")), model=model
         )
-        print(request.usage)
-        return request.choices[0].message.content
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", 0) or 0
+        METRICS.observe("llm_prompt_tokens", usage.prompt_tokens or 0, model=model)
+        METRICS.observe(
+            "llm_completion_tokens", usage.completion_tokens or 0, model=model
+        )
+        METRICS.observe("llm_cached_tokens", cached_tokens, model=model)
+        METRICS.inc("llm_prompt_tokens_total", usage.prompt_tokens or 0, model=model)
+        METRICS.inc(
+            "llm_completion_tokens_total", usage.completion_tokens or 0, model=model
+        )
+        METRICS.inc("llm_cached_tokens_total", cached_tokens, model=model)
+
+    def _cache_hit(self):
+        self.last_usage = None  # Nothing was spent on a cached reply
+        METRICS.inc("llm_cache_hits_total", model=self.model)
+
+    def request(self, timeout: float = None) -> str:
+        key, reply = self._cached()
+        if reply is not None:
+            self._cache_hit()
+            return reply
+
+        reply, self.last_usage, complete = self._request_with_retries(timeout)
+        if key is not None and complete:  # An aborted stream is not worth replaying
+            self.cache.put(key, reply)
+        return reply
+
+    def _request_with_retries(self, timeout):
+        """
+        Sends the current messages, retrying retryable errors with backoff, then
+        falling back to the secondary model if the primary one gave up.
+
+        Returns:
+            tuple: (reply, usage, complete), see _call.
+        """
+        error = None
+        for target, (client, model) in enumerate(self._targets()):
+            if target:
+                METRICS.inc("llm_fallback_requests_total", model=model)
+            for attempt in range(self.retry.max_retries + 1):
+                try:
+                    return self._hedged_call(client, model, timeout)
+                except RETRYABLE_ERRORS as e:
+                    error = e
+                except Exception as e:
+                    error = e
+                    break  # Not worth retrying on this model
+                if attempt < self.retry.max_retries:
+                    METRICS.inc("llm_retries_total", model=model)
+                    time.sleep(self.retry.delay(attempt))
+        raise error
+
+    def _hedged_call(self, client, model, timeout):
+        """
+        Makes one attempt. If it is slower than the hedge delay of the retry
+        policy, a duplicate request is sent and the first successful reply wins
+        (the other call finishes in the background and is ignored).
+
+        Both calls get the messages of this attempt, so a losing call still
+        running when the next turn starts doesn't send the new messages. At most
+        MAX_OUTSTANDING_HEDGES losing calls may still be running; while that many
+        are, attempts are not hedged, so the pool never queues a call.
+        """
+        delay = self.retry.hedge_delay()
+        if delay is None:
+            return self._call(client, model, timeout)
+
+        if self._hedge_pool is None:
+            self._hedge_pool = ThreadPoolExecutor(
+                max_workers=self.MAX_OUTSTANDING_HEDGES + 2,
+                thread_name_prefix="llm-hedge",
+            )
+        self._hedge_futures = {
+            future for future in self._hedge_futures if not future.done()
+        }
+        messages = self.messages
+        first = self._submit_hedge(client, model, timeout, messages)
+        try:
+            return first.result(timeout=delay)
+        except FutureTimeoutError:
+            pass
+
+        if (
+            len(self._hedge_futures) > self.MAX_OUTSTANDING_HEDGES
+        ):  # The losers and this attempt
+            METRICS.inc("llm_hedges_skipped_total", model=model)
+            return first.result()
+
+        METRICS.inc("llm_hedged_requests_total", model=model)
+        second = self._submit_hedge(client, model, timeout, messages)
+        for future in as_completed([first, second]):
+            if future.exception() is None:
+                if future is second:
+                    METRICS.inc("llm_hedge_wins_total", model=model)
+                return future.result()
+        raise first.exception()
+
+    def _submit_hedge(self, client, model, timeout, messages):
+        future = self._hedge_pool.submit(self._call, client, model, timeout, messages)
+        self._hedge_futures.add(future)
+        return future
+
+    def close(self):
+        """
+        Releases the hedge threads and the response cache. Losing calls still
+        running are not waited for.
+        """
+        if self._hedge_pool is not None:
+            self._hedge_pool.shutdown(wait=False, cancel_futures=True)
+            self._hedge_pool = None
+            self._hedge_futures = set()
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+
+    def _stream_params(self) -> dict:
+        return (
+            {"stream": True, "stream_options": {"include_usage": True}}
+            if self.stream
+            else {}
+        )
+
+    def _call(self, client, model, timeout, messages=None):
+        """
+        Sends the messages once (the current ones if not given).
+
+        Returns:
+            tuple: (reply, usage, complete). complete is False when a streamed
+            reply was aborted because it could not be valid; the partial reply
+            is returned so the simulation rejects it as a format error.
+        """
+        messages = messages or self.messages
+        started = time.perf_counter()
+        try:
+            with PROFILER.span("llm.http", "llm", model=model):
+                request = client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    **self.request_params,
+                    **self._stream_params(),
+                    **self._timeout_params(timeout),
+                    # reasoning_effort='low' || 'high' || 'medium'
+                )
+                if self.stream:
+                    reply, usage, complete = self._read_stream(
+                        request, started, model, messages
+                    )
+                else:
+                    # content is None when the model returned no text (e.g. a refusal)
+                    reply, usage, complete = (
+                        request.choices[0].message.content or "",
+                        request.usage,
+                        True,
+                    )
+        except Exception as e:
+            self._record_request(started, error=e, model=model, messages=messages)
+            raise
+        self.retry.latencies.add(time.perf_counter() - started)
+        self._record_request(started, reply, usage, model=model, messages=messages)
+        return reply, usage, complete
+
+    def _read_stream(self, stream, started, model, messages):
+        """
+        Reads a streamed reply, recording the time to first token, and stops as
+        soon as the text can't become a valid reply (see utils.stream_json).
+
+        Returns:
+            tuple: (reply, usage, complete), like _call. The usage of an aborted
+            reply is estimated, the provider only reports it at the end.
+        """
+        checker = IncrementalJsonChecker()
+        parts, usage = [], None
+        try:
+            for chunk in stream:
+                text = self._chunk_text(chunk, started, model, parts)
+                usage = chunk.usage or usage
+                if text and not checker.feed(text):
+                    return self._aborted_stream(parts, usage, model, messages)
+        finally:
+            stream.close()  # Cancels the generation when aborted
+        return "".join(parts), usage, True
+
+    def _aborted_stream(self, parts, usage, model, messages):
+        """
+        Returns (reply, usage, False) for a stream cancelled after parts. The
+        tokens paid so far are estimated from the prompt and the partial reply
+        when the provider did not report them.
+        """
+        METRICS.inc("llm_stream_aborts_total", model=model)
+        reply = "".join(parts)
+        if usage is None:
+            prompt_tokens = sum(
+                estimate_tokens(message["content"]) for message in messages
+            )
+            completion_tokens = estimate_tokens(reply)
+            usage = SimpleNamespace(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens,
+            )
+        return reply, usage, False
+
+    def _chunk_text(self, chunk, started, model, parts):
+        """
+        Returns the text of a stream chunk and adds it to parts.
+        """
+        text = chunk.choices[0].delta.content if chunk.choices else None
+        if not text:
+            return None
+        if not parts:
+            METRICS.observe(
+                "llm_ttft_seconds", time.perf_counter() - started, model=model
+            )
+        parts.append(text)
+        return text
+
+
+class AsyncLLMApi(LLMApi):
+    """
+    Asyncio variant of LLMApi built on the async OpenAI-compatible client.
+
+    Requests go through a semaphore that bounds how many calls are in flight,
+    and through an optional ProviderLimiter (request and token budgets).
+    Episodes driven by the same event loop should share the clients, the
+    semaphore and the retry policy (whose latencies drive hedging), e.g.
+    AsyncLLMApi(path, client=api.client, semaphore=api.semaphore, retry=api.retry,
+    fallback_client=api.fallback_client).
+    """
+
+    DEFAULT_MAX_CONCURRENCY = 8
+
+    def __init__(
+        self,
+        config_path: str = "configapi.json",
+        max_concurrency: int = None,
+        client=None,
+        semaphore=None,
+        retry=None,
+        fallback_client=None,
+        limiter=None,
+        config: dict = None,
+    ):
+        self._shared_clients = {"primary": client, "fallback": fallback_client}
+        super().__init__(config_path, config=config)
+        if retry is not None:
+            self.retry = retry
+        self.limiter = limiter
+
+        if max_concurrency is None:
+            max_concurrency = self.config["api_client"].get(
+                "max_concurrency", self.DEFAULT_MAX_CONCURRENCY
+            )
+        self.max_concurrency = max_concurrency
+        self.semaphore = (
+            semaphore if semaphore is not None else asyncio.Semaphore(max_concurrency)
+        )
+
+    def _create_client(self, client_config: dict, role: str = "primary"):
+        if self._shared_clients.get(role) is not None:
+            return self._shared_clients[role]
+        return AsyncOpenAI(
+            base_url=client_config["base_url"],
+            api_key=client_config["api_key"],
+            **self._client_retry_params(),
+        )
+
+    async def request(self, timeout: float = None) -> str:
+        key, reply = self._cached()
+        if reply is not None:
+            self._cache_hit()
+            return reply
+
+        reply, self.last_usage, complete = await self._request_with_retries(timeout)
+        if key is not None and complete:  # An aborted stream is not worth replaying
+            self.cache.put(key, reply)
+        return reply
+
+    async def _request_with_retries(self, timeout):
+        error = None
+        for target, (client, model) in enumerate(self._targets()):
+            if target:
+                METRICS.inc("llm_fallback_requests_total", model=model)
+            for attempt in range(self.retry.max_retries + 1):
+                try:
+                    return await self._hedged_call(client, model, timeout)
+                except RETRYABLE_ERRORS as e:
+                    error = e
+                except Exception as e:
+                    error = e
+                    break  # Not worth retrying on this model
+                if attempt < self.retry.max_retries:
+                    METRICS.inc("llm_retries_total", model=model)
+                    await asyncio.sleep(self.retry.delay(attempt))
+        raise error
+
+    async def _hedged_call(self, client, model, timeout):
+        """
+        Like LLMApi._hedged_call, but the losing request is cancelled.
+        """
+        delay = self.retry.hedge_delay()
+        if delay is None:
+            return await self._call(client, model, timeout)
+
+        messages = self.messages
+        first = asyncio.ensure_future(self._call(client, model, timeout, messages))
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+
+        METRICS.inc("llm_hedged_requests_total", model=model)
+        second = asyncio.ensure_future(self._call(client, model, timeout, messages))
+        pending = {first, second}
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for future in done:
+                if future.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    if future is second:
+                        METRICS.inc("llm_hedge_wins_total", model=model)
+                    return future.result()
+        raise first.exception()
+
+    async def _call(self, client, model, timeout, messages=None):
+        messages = messages or self.messages
+        estimate = 0
+        if self.limiter is not None:
+            # Budget the prompt now, correct it with the reported usage afterwards
+            estimate = sum(estimate_tokens(message["content"]) for message in messages)
+            await self.limiter.acquire(estimate)
+        # Tokens charged in the end: none if the call fails or is cancelled (lost hedge)
+        spent = 0
+        try:
+            async with self.semaphore:
+                # Time spent waiting for the semaphore is not latency
+                started = time.perf_counter()
+                try:
+                    with PROFILER.span("llm.http", "llm", model=model):
+                        request = await client.chat.completions.create(
+                            model=model,
+                            messages=messages,
+                            **self.request_params,
+                            **self._stream_params(),
+                            **self._timeout_params(timeout),
+                        )
+                        if self.stream:
+                            reply, usage, complete = await self._read_stream(
+                                request, started, model, messages
+                            )
+                        else:
+                            reply, usage, complete = (
+                                request.choices[0].message.content or "",
+                                request.usage,
+                                True,
+                            )
+                except Exception as e:
+                    self._record_request(
+                        started, error=e, model=model, messages=messages
+                    )
+                    raise
+            self.retry.latencies.add(time.perf_counter() - started)
+            self._record_request(started, reply, usage, model=model, messages=messages)
+            spent = (usage.total_tokens or 0) if usage is not None else estimate
+            return reply, usage, complete
+        finally:
+            # CancelledError isn't an Exception, so the except above can't refund
+            if self.limiter is not None:
+                self.limiter.settle(spent - estimate)
+
+    async def _read_stream(self, stream, started, model, messages):
+        checker = IncrementalJsonChecker()
+        parts, usage = [], None
+        try:
+            async for chunk in stream:
+                text = self._chunk_text(chunk, started, model, parts)
+                usage = chunk.usage or usage
+                if text and not checker.feed(text):
+                    return self._aborted_stream(parts, usage, model, messages)
+        finally:
+            await stream.close()  # Cancels the generation when aborted
+        return "".join(parts), usage, True
+
 
 def main():
-    api = LLMApi('configapi.json')
+    api = LLMApi("configapi.json")
 
     api.setInitialContext(
         "You are observing a simulation with several moving agents and a door. You can press one of six buttons: btn1, btn2, btn3, btn4, btn5, btn6. Your goal is to help all agents exit through the door. Use the outcomes of each action to understand the system and act accordingly. After each step, think out loud and choose the next button."
@@ -68,7 +598,6 @@ def main():
 
     data = {}
 
-  
     api.generate(msg=data)
 
     print(api.request())
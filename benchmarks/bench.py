@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite of the simulation.
+
+Measures grid generation, NPC stepping (Simulation and BatchSimulation),
+turn JSON and prompt building as the memory grows, the size (estimated
+tokens) and encode time of every observation encoding, logger throughput and
+headless render_grid frame time (SDL dummy video driver), over a sweep of
+grid sizes and agent counts. Results are written as JSON so two runs
+(e.g. two commits) can be compared:
+
+    python -m benchmarks.bench -o before.json
+    python -m benchmarks.bench -o after.json
+    python -m benchmarks.bench compare before.json after.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from datetime import timezone
+
+# Render without a window and keep the output clean
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import numpy as np  # noqa: E402
+import pygame  # noqa: E402
+
+from simulation import Simulation  # noqa: E402
+from stub_api import StubLLMApi  # noqa: E402
+from utils.batch_env import BatchSimulation  # noqa: E402
+from utils.generate_grid import _generate_grid  # noqa: E402
+from utils.generate_log import JsonLogger  # noqa: E402
+from utils.observation import ENCODINGS  # noqa: E402
+
+SIZES = [4, 16, 64, 256, 1000]
+AGENTS = [1, 4, 9, 100, 1000, 5000]
+MEMORY_TURNS = [10, 100, 1000]
+MEMORY_STRATEGIES = ["full", "window", "delta", "compact"]
+OBSERVATION_TURNS = 10
+QUICK = {"sizes": [4, 16, 64], "agents": [1, 4, 9], "turns": [10, 100]}
+
+BATCH_SIZE = 64
+LOG_RECORDS = 10000
+SQUARE_TAM = 20  # Smallest square size the simulation accepts
+MAX_RENDER_SIDE = (
+    8192  # Larger windows are skipped (a 1000x1000 grid would need 20k pixels per side)
+)
+
+
+def measure(func, min_time=0.2, min_runs=3, max_runs=1000):
+    """
+    Calls func repeatedly until min_time has passed (and at least min_runs times).
+
+    Returns:
+        dict: Number of runs and min/median/mean duration of a call, in seconds.
+    """
+    times = []
+    start = time.perf_counter()
+    while len(times) < max_runs and (
+        len(times) < min_runs or time.perf_counter() - start < min_time
+    ):
+        call_start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - call_start)
+    return {
+        "runs": len(times),
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.fmean(times),
+    }
+
+
+def make_config(size, agents, strategy="full"):
+    """
+    Builds a Simulation configuration for a size x size grid (borders excluded).
+    """
+    return {
+        "game": {"characters_num": agents, "door_size": 3, "max_turns": None},
+        "screen": {
+            "x_grid_max": size,
+            "y_grid_max": size,
+            "square_tam": SQUARE_TAM,
+            "space_tam": 2,
+            "fps": 60,
+        },
+        "memory": {"strategy": strategy, "window": 10, "compact_every": 10},
+    }
+
+
+def make_simulation(config, headless=True, seed=0):
+    return Simulation(
+        headless=headless,
+        api=StubLLMApi("random", seed=seed),
+        config=config,
+        verbose=False,
+        seed=seed,
+        log=False,
+    )
+
+
+def bench_generate_grid(size, agents):
+    rng = random.Random(0)
+    return measure(lambda: _generate_grid(size + 2, size + 2, agents, 3, rng=rng))
+
+
+def bench_npc_step(size, agents):
+    # The door stays closed, no NPC exits
+    simul = make_simulation(make_config(size, agents))
+    stats = measure(simul._move_npcs)
+    stats["npc_moves_per_s"] = max(agents - 1, 0) / stats["median"]
+    return stats
+
+
+def bench_batch_step(size, agents):
+    batch = BatchSimulation(BATCH_SIZE, size + 2, size + 2, agents, door_size=3, seed=0)
+    rng = np.random.default_rng(0)
+
+    def step():
+        if not batch.running.any():
+            batch.reset()
+        batch.step(rng.integers(0, 6, BATCH_SIZE))
+
+    stats = measure(step)
+    stats["episode_steps_per_s"] = BATCH_SIZE / stats["median"]
+    return stats
+
+
+def bench_turn_json(strategy, turns, size=8, agents=4):
+    """
+    Times generate_JSON and the prompt build (LLMApi.generate) at the given
+    memory length, over the last 10% of the turns (at least 10).
+    """
+    simul = make_simulation(make_config(size, agents, strategy))
+    simul.generate_JSON(action="start")
+    window = min(turns, max(turns // 10, 10))
+    json_times, prompt_times = [], []
+
+    for turn in range(turns):
+        simul._move_npcs()
+        simul.turn += 1
+
+        start = time.perf_counter()
+        simul.generate_JSON(
+            "btn1",
+            "previous reasoning " * 10,
+            "next reasoning " * 10,
+            "btn1: move_left",
+        )
+        built = time.perf_counter()
+        simul.api.generate(msg=simul.json_data)
+        done = time.perf_counter()
+
+        if turn >= turns - window:
+            json_times.append(built - start)
+            prompt_times.append(done - built)
+
+    return {
+        "runs": window,
+        "median": statistics.median(json_times),
+        "generate_json_median": statistics.median(json_times),
+        "prompt_build_median": statistics.median(prompt_times),
+        "payload_bytes": len(simul.api.payload.encode("utf-8")),
+    }
+
+
+def bench_observation(encoding, size, agents, turns=OBSERVATION_TURNS):
+    """
+    Encode time and estimated tokens of the current state with an observation
+    encoding, over the first turns of an episode (NPCs moving, door open).
+    """
+    simul = make_simulation(make_config(size, agents))
+    simul.door_state = "open"
+    encoder = ENCODINGS[encoding](agents)
+    times, tokens = [], []
+
+    for turn in range(turns):
+        agents_position = [
+            {"id": char.idx, "x": char.pos[1], "y": char.pos[0]}
+            for char in simul.characters
+        ]
+        start = time.perf_counter()
+        fields = encoder.encode(agents_position, simul.mainGrid)
+        times.append(time.perf_counter() - start)
+        tokens.append(encoder.estimate_tokens(fields))
+        simul._move_npcs()
+
+    return {
+        "runs": turns,
+        "median": statistics.median(times),
+        "first_turn_tokens": tokens[0],
+        "tokens_median": statistics.median(tokens),
+    }
+
+
+def bench_logger(records=LOG_RECORDS):
+    """
+    Logger throughput: time spent by the caller (enqueueing) and until every
+    record is on disk.
+    """
+    record = {
+        "turn": 1,
+        "choice": "btn1",
+        "llm": {
+            "prev_reasoning": "previous reasoning " * 20,
+            "key_action_map": "btn1: move_left",
+            "next_reasoning": "next reasoning " * 20,
+            "choice": "btn1",
+        },
+        "usage": {
+            "prompt_tokens": 1000,
+            "completion_tokens": 100,
+            "total_tokens": 1100,
+        },
+        "moved": [[0, 1, 2], [1, 3, 4]],
+    }
+    with tempfile.TemporaryDirectory() as folder:
+        logger = JsonLogger(
+            folder_path=folder, file_name="bench.jsonl", model_name="bench"
+        )
+        start = time.perf_counter()
+        for turn in range(records):
+            logger.log("turn", **record)
+        enqueued = time.perf_counter()
+        logger.close()
+        done = time.perf_counter()
+        size = os.path.getsize(logger.log_path)
+
+    return {
+        "runs": records,
+        "median": (enqueued - start) / records,
+        "enqueue_per_record": (enqueued - start) / records,
+        "records_per_s": records / (done - start),
+        "bytes": size,
+    }
+
+
+def bench_render(size, agents):
+    """
+    Frame time of render_grid: a full redraw and an incremental frame after a turn.
+    """
+    if (size + 2) * SQUARE_TAM > MAX_RENDER_SIDE:
+        return None
+    simul = make_simulation(make_config(size, agents), headless=False)
+    simul.render_grid()  # Builds the static layer
+
+    def full():
+        simul.redraw_all = True
+        simul.render_grid()
+
+    def incremental():
+        simul._move_npcs()
+        simul.render_grid()
+
+    full_stats = measure(full)
+    incremental_stats = measure(incremental)
+    pygame.display.quit()
+    return {
+        "runs": incremental_stats["runs"],
+        "median": incremental_stats["median"],
+        "full_frame_median": full_stats["median"],
+        "incremental_frame_median": incremental_stats["median"],
+    }
+
+
+def _sweep(sizes, agents):
+    for size in sizes:
+        for count in agents:
+            if count <= size * size:
+                yield size, count
+
+
+def run_benchmarks(sizes, agents, turns, only=None, verbose=True):
+    """
+    Runs the benchmark cases.
+
+    Args:
+        sizes (list of int): Grid sizes (borders excluded).
+        agents (list of int): Agent counts; counts that don't fit a grid are skipped.
+        turns (list of int): Memory lengths of the turn JSON benchmark.
+        only (list of str): Run only these benchmarks.
+        verbose (bool): If True, prints every result.
+
+    Returns:
+        list of dict: One entry per case: bench, params and stats (or error).
+    """
+    cases = []
+    for size, count in _sweep(sizes, agents):
+        cases.append(
+            ("generate_grid", {"size": size, "agents": count}, bench_generate_grid)
+        )
+        cases.append(("npc_step", {"size": size, "agents": count}, bench_npc_step))
+        cases.append(("batch_step", {"size": size, "agents": count}, bench_batch_step))
+        cases.append(("render", {"size": size, "agents": count}, bench_render))
+        for encoding in ENCODINGS:
+            cases.append(
+                (
+                    "observation",
+                    {"encoding": encoding, "size": size, "agents": count},
+                    bench_observation,
+                )
+            )
+    for strategy in MEMORY_STRATEGIES:
+        for count in turns:
+            cases.append(
+                ("turn_json", {"strategy": strategy, "turns": count}, bench_turn_json)
+            )
+    cases.append(("logger", {"records": LOG_RECORDS}, bench_logger))
+
+    results = []
+    for bench, params, func in cases:
+        if only and bench not in only:
+            continue
+        try:
+            stats = func(**params)
+        except Exception as e:  # e.g. a configuration the simulation rejects
+            stats, error = None, f"{type(e).__name__}: {e}"
+        else:
+            error = None if stats else "skipped"
+
+        entry = {"bench": bench, "params": params}
+        if error is None:
+            entry["stats"] = stats
+        else:
+            entry["error"] = error
+        results.append(entry)
+        if verbose:
+            summary = (
+                f"{entry['stats']['median'] * 1e3:.3f} ms"
+                if "stats" in entry
+                else entry["error"]
+            )
+            print(f"{bench:14s} {json.dumps(params):40s} {summary}", flush=True)
+    return results
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadata():
+    return {
+        "commit": _commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pygame": pygame.version.ver,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(old_path, new_path, threshold=0.1):
+    """
+    Prints the median time ratio (new / old) of every case found in both files.
+
+    Returns:
+        int: Number of cases slower than 1 + threshold.
+    """
+
+    def load(path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return data["meta"], {
+            (entry["bench"], json.dumps(entry["params"], sort_keys=True)): entry[
+                "stats"
+            ]["median"]
+            for entry in data["results"]
+            if "stats" in entry
+        }
+
+    old_meta, old = load(old_path)
+    new_meta, new = load(new_path)
+    print(f"old: {old_meta.get('commit')}  new: {new_meta.get('commit')}")
+
+    regressions = 0
+    for key in sorted(old.keys() & new.keys()):
+        ratio = new[key] / old[key] if old[key] else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif ratio < 1 - threshold:
+            flag = "  faster"
+        print(
+            f"{key[0]:14s} {key[1]:40s} {old[key] * 1e3:10.3f} ms -> "
+            f"{new[key] * 1e3:10.3f} ms  x{ratio:.2f}{flag}"
+        )
+    return regressions
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "compare":
+        parser = argparse.ArgumentParser(
+            prog="bench compare", description="Compare two benchmark results."
+        )
+        parser.add_argument("old")
+        parser.add_argument("new")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.1,
+            help="relative slowdown reported as regression",
+        )
+        args = parser.parse_args(sys.argv[2:])
+        sys.exit(1 if compare(args.old, args.new, args.threshold) else 0)
+
+    parser = argparse.ArgumentParser(description="Run the offline benchmark suite.")
+    parser.add_argument(
+        "-o",
+        "--output",
+        default=None,
+        help="results file (default: benchmarks/results/<commit>.json)",
+    )
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=SIZES, help="grid sizes"
+    )
+    parser.add_argument(
+        "--agents", type=int, nargs="+", default=AGENTS, help="agent counts"
+    )
+    parser.add_argument(
+        "--turns", type=int, nargs="+", default=MEMORY_TURNS, help="memory lengths"
+    )
+    parser.add_argument(
+        "--only", nargs="+", default=None, help="run only these benchmarks"
+    )
+    parser.add_argument("--quick", action="store_true", help="small sweep")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.sizes, args.agents, args.turns = (
+            QUICK["sizes"],
+            QUICK["agents"],
+            QUICK["turns"],
+        )
+
+    meta = metadata()
+    results = run_benchmarks(args.sizes, args.agents, args.turns, args.only)
+
+    output = args.output or os.path.join(
+        "benchmarks", "results", f"{meta['commit'] or 'local'}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2)
+    print("results written to", output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,9 @@
+from functools import lru_cache
+
 import pygame
+from utils.grid_codes import agent_code
+from utils.grid_codes import DOOR
+from utils.grid_codes import EMPTY
 
 # Initialize font system when module is imported
 pygame.font.init()
@@ -27,6 +32,15 @@ class Character:
         self.ball_radius = ball_radius
         self.square_tam = square_tam
         self.door_state = door_state
+        self._label = None  # Rendered ID number, created on the first draw
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _font():
+        """
+        Returns the font used for the ID numbers, created once.
+        """
+        return pygame.font.Font(None, 24)
 
     def can_move(self, grid, new_pos):
         """
@@ -40,7 +54,7 @@ class Character:
             bool: True if the move is valid (cell is empty), False otherwise.
         """
         y, x = new_pos
-        return grid[y, x] == "." or (grid[y, x] == "D" and self.door_state == "open") 
+        return grid[y, x] == EMPTY or (grid[y, x] == DOOR and self.door_state == "open")
 
     def move(self, grid, new_pos, door_state):
         """
@@ -55,9 +69,9 @@ class Character:
         """
         self.door_state = door_state
         if self.can_move(grid, new_pos):
-            grid[self.pos] = "."  # Clear current position
+            grid[self.pos] = EMPTY  # Clear current position
             self.pos = new_pos
-            grid[new_pos[0], new_pos[1]] = str(self.idx)  # Mark new position
+            grid[new_pos[0], new_pos[1]] = agent_code(self.idx)  # Mark new position
             return True
         return False
 
@@ -74,19 +88,25 @@ class Character:
             y * self.square_tam + self.square_tam // 2,
         )
         pygame.draw.circle(screen, self.color, center, self.ball_radius)
-        
+
         # Draw the character ID number in the center with contrasting color
-        font = pygame.font.Font(None, 24)
-        id_text = str(self.idx)
-        
-        # Choose text color based on background color for better contrast
-        # Calculate brightness of the character color
-        r, g, b = self.color
-        brightness = (r * 0.299 + g * 0.587 + b * 0.114)
-        
-        # Use white text on dark colors, black text on light colors
-        text_color = (255, 255, 255) if brightness < 128 else (0, 0, 0)
-        
-        text_surface = font.render(id_text, True, text_color)
-        text_rect = text_surface.get_rect(center=center)
-        screen.blit(text_surface, text_rect)
+        if self._label is None:
+            # Choose text color based on background color for better contrast
+            # Calculate brightness of the character color
+            r, g, b = self.color
+            brightness = r * 0.299 + g * 0.587 + b * 0.114
+
+            # Use white text on dark colors, black text on light colors
+            text_color = (255, 255, 255) if brightness < 128 else (0, 0, 0)
+            label = Character._font().render(str(self.idx), True, text_color)
+            # Shrink long IDs to the square so they don't spill over the
+            # neighbouring cells (the renderer only redraws changed cells)
+            width, height = label.get_size()
+            if width > self.square_tam:
+                label = pygame.transform.smoothscale(
+                    label, (self.square_tam, max(1, height * self.square_tam // width))
+                )
+            self._label = label
+
+        text_rect = self._label.get_rect(center=center)
+        screen.blit(self._label, text_rect)
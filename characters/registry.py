@@ -0,0 +1,87 @@
+import numpy as np
+
+
+class AgentRegistry:
+    """
+    Index of the characters of an episode.
+
+    Alive characters are kept in a dense list for iteration; ids map to their
+    character and to their slot in that list, so lookups and removals are
+    O(1) (a removed character is replaced by the last one). Exits are tracked
+    in the `alive` array. Consumers that need to know which characters changed
+    (the logger, the renderer) get a change set from track(), filled by
+    moved() and remove().
+    """
+
+    def __init__(self, capacity):
+        """
+        Args:
+            capacity (int): Number of characters of the episode (ids 0 to capacity - 1).
+        """
+        self._agents = []  # Alive characters
+        self._by_id = [None] * capacity
+        self._slot = [-1] * capacity  # Index of each id in _agents
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.player = None  # The character controlled by the LLM
+        self._trackers = []
+
+    def __iter__(self):
+        return iter(self._agents)
+
+    def __len__(self):
+        return len(self._agents)
+
+    def add(self, agent, player=False):
+        """
+        Adds a character.
+
+        Args:
+            agent (Character): The character, with a unique idx.
+            player (bool): If True, the character is the LLM controlled one.
+        """
+        self._slot[agent.idx] = len(self._agents)
+        self._agents.append(agent)
+        self._by_id[agent.idx] = agent
+        self.alive[agent.idx] = True
+        if player:
+            self.player = agent
+        self.moved(agent.idx)
+
+    def get(self, idx):
+        """
+        Returns the character with the given id, alive or not.
+        """
+        return self._by_id[idx]
+
+    def is_alive(self, idx):
+        return bool(self.alive[idx])
+
+    def remove(self, idx):
+        """
+        Removes a character (e.g. an NPC that exited). The last character of the
+        iteration order takes its place.
+        """
+        slot = self._slot[idx]
+        last = self._agents.pop()
+        if last.idx != idx:
+            self._agents[slot] = last
+            self._slot[last.idx] = slot
+        self._slot[idx] = -1
+        self.alive[idx] = False
+        self.moved(idx)
+
+    def moved(self, idx):
+        """
+        Records that a character changed (moved, was added or removed).
+        """
+        for changes in self._trackers:
+            changes.add(idx)
+
+    def track(self):
+        """
+        Returns a new set that collects the ids of the characters that change
+        from now on. The caller clears it once it has handled the changes.
+        """
+        changes = set()
+        self._trackers.append(changes)
+        return changes
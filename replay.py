@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import time
+from collections import Counter
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame  # noqa: E402
+
+from simulation import Simulation  # noqa: E402
+from stub_api import StubLLMApi  # noqa: E402
+from utils.trajectory import load_trajectories  # noqa: E402
+
+
+def replay(trajectory, render=False, delay=0.0):
+    """
+    Rebuilds a recorded episode turn by turn, without any LLM call.
+
+    Args:
+        trajectory (Trajectory): The recorded episode.
+        render (bool): If True, draws every turn in a Pygame window.
+        delay (float): Pause between rendered turns, in seconds.
+
+    Yields:
+        Simulation: The simulation after the initial state and after each turn.
+
+    Raises:
+        ValueError: If the trajectory was recorded with another format.
+    """
+    trajectory.check_format()
+    simul = Simulation(
+        headless=not render,
+        # Never called, the buttons come from the trajectory
+        api=StubLLMApi("sequence"),
+        config=trajectory.config,
+        verbose=False,
+        seed=trajectory.seed,
+        log=False,
+    )
+    yield simul
+
+    for choice in trajectory.buttons:
+        simul.replay_turn(choice)
+        if render:
+            pygame.event.pump()
+            simul.render_grid()
+            time.sleep(delay)
+        yield simul
+        if simul.outcome is not None:
+            break
+
+
+def replay_outcome(trajectory):
+    """
+    Replays a whole episode and returns its final simulation state.
+    """
+    for simul in replay(trajectory):
+        pass
+    return simul
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay recorded mirror test episodes."
+    )
+    parser.add_argument("path", help="trajectories JSONL file")
+    parser.add_argument(
+        "-i", "--index", type=int, default=None, help="replay only this episode"
+    )
+    parser.add_argument(
+        "--render", action="store_true", help="draw the episode in a window"
+    )
+    parser.add_argument(
+        "--delay", type=float, default=0.3, help="pause between rendered turns (s)"
+    )
+    args = parser.parse_args()
+
+    trajectories = load_trajectories(args.path)
+    if args.index is not None:
+        trajectories = [trajectories[args.index]]
+
+    if args.render:
+        for trajectory in trajectories:
+            for simul in replay(trajectory, render=True, delay=args.delay):
+                pass
+        pygame.quit()
+        return
+
+    outcomes = Counter()
+    mismatches = rejected = errors = 0
+    for trajectory in trajectories:
+        if trajectory.outcome == "error":
+            # Cut short by an API failure: the turns replay, the ending can't
+            errors += 1
+            continue
+        try:
+            simul = replay_outcome(trajectory)
+        except ValueError as e:
+            print(e)
+            rejected += 1
+            continue
+        outcomes[simul.outcome] += 1
+        if trajectory.outcome is not None and simul.outcome != trajectory.outcome:
+            mismatches += 1
+    print(
+        "summary:",
+        dict(outcomes),
+        "mismatches:",
+        mismatches,
+        "rejected:",
+        rejected,
+        "api errors:",
+        errors,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import os
+from collections import Counter
+from concurrent.futures import as_completed
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from datetime import timezone
+
+# Keep worker processes quiet when pygame is imported
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from api import AsyncLLMApi  # noqa: E402
+from simulation import Simulation  # noqa: E402
+from stub_api import AsyncStubLLMApi  # noqa: E402
+from stub_api import POLICIES  # noqa: E402
+from stub_api import StubLLMApi  # noqa: E402
+from utils.metrics import METRICS  # noqa: E402
+from utils.profiling import PROFILER  # noqa: E402
+from utils.profiling import profile_to  # noqa: E402
+from utils.trajectory import save_trajectories  # noqa: E402
+
+
+def run_episode(
+    episode,
+    batch_name=None,
+    verbose=False,
+    stub=None,
+    latency=0.0,
+    seed=None,
+    profile_dir=None,
+):
+    """
+    Runs a single headless episode.
+
+    Args:
+        episode (int): Episode index inside the batch.
+        batch_name (str): Prefix used for the episode log file name.
+        verbose (bool): If True, prints the simulation output.
+        stub (str): If set, name of the StubLLMApi policy used instead of the LLM.
+        latency (float): Artificial latency of the stub backend, in seconds.
+        seed (int): Episode seed. A random one is drawn if not given.
+        profile_dir (str): If set, the episode runs under cProfile and its stats
+            are written to <profile_dir>/ep<episode>.prof.
+
+    Returns:
+        EpisodeResult: The outcome of the episode.
+    """
+    log_name = f"{batch_name}_ep{episode:04d}.jsonl" if batch_name else None
+    profile_path = (
+        os.path.join(profile_dir, f"ep{episode:04d}.prof") if profile_dir else None
+    )
+    with profile_to(profile_path), PROFILER.span("episode", "episode", episode=episode):
+        api = StubLLMApi(stub, latency=latency) if stub else None
+        simul = Simulation(
+            headless=True, api=api, log_name=log_name, verbose=verbose, seed=seed
+        )
+        return simul.run_episode()
+
+
+def _run_episode_in_worker(trace, *args):
+    """
+    run_episode for the worker processes: also returns the metrics and trace
+    events recorded in the worker, so they can be merged in the parent.
+    """
+    if trace:
+        PROFILER.enable()
+    result = run_episode(*args)
+    return result, METRICS.drain(), PROFILER.drain()
+
+
+def _episode_seed(seed, episode):
+    return seed + episode if seed is not None else None
+
+
+def run_episodes(
+    n, workers=None, verbose=False, stub=None, latency=0.0, seed=None, profile_dir=None
+):
+    """
+    Runs n headless episodes in parallel across CPU cores.
+
+    Args:
+        n (int): Number of episodes to run.
+        workers (int): Number of worker processes. Defaults to the number of CPUs.
+            With workers=1 the episodes run sequentially in the current process.
+        verbose (bool): If True, prints the simulation output.
+        stub (str): If set, name of the StubLLMApi policy used instead of the LLM.
+        latency (float): Artificial latency of the stub backend, in seconds.
+        seed (int): Base seed; episode i uses seed + i. Random seeds if not given.
+        profile_dir (str): If set, each episode is profiled with cProfile (see
+            run_episode).
+            Trace events are collected from the workers when PROFILER is enabled.
+
+    Returns:
+        list of EpisodeResult: Results ordered by episode index.
+    """
+    batch_name = datetime.now(timezone.utc).isoformat().replace(":", "-").split(".")[0]
+
+    if workers == 1:
+        return [
+            run_episode(
+                episode,
+                batch_name,
+                verbose,
+                stub,
+                latency,
+                _episode_seed(seed, episode),
+                profile_dir,
+            )
+            for episode in range(n)
+        ]
+
+    results = [None] * n
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(
+                _run_episode_in_worker,
+                PROFILER.enabled,
+                episode,
+                batch_name,
+                verbose,
+                stub,
+                latency,
+                _episode_seed(seed, episode),
+                profile_dir,
+            ): episode
+            for episode in range(n)
+        }
+        for future in as_completed(futures):
+            results[futures[future]], metrics, events = future.result()
+            METRICS.merge(metrics)
+            PROFILER.extend(events)
+    return results
+
+
+async def _run_episodes_async(n, max_concurrency, verbose, stub, latency, seed):
+    batch_name = datetime.now(timezone.utc).isoformat().replace(":", "-").split(".")[0]
+
+    if stub:
+        make_api = lambda: AsyncStubLLMApi(stub, latency=latency)  # noqa: E731
+        shared = None
+    else:
+        # One client, semaphore and retry policy shared by every episode of the batch
+        shared = AsyncLLMApi("configapi.json", max_concurrency=max_concurrency)
+        make_api = lambda: AsyncLLMApi(  # noqa: E731
+            "configapi.json",
+            client=shared.client,
+            semaphore=shared.semaphore,
+            retry=shared.retry,
+            fallback_client=shared.fallback_client,
+        )
+
+    simulations = [
+        Simulation(
+            headless=True,
+            api=make_api(),
+            log_name=f"{batch_name}_ep{episode:04d}.jsonl",
+            verbose=verbose,
+            seed=_episode_seed(seed, episode),
+        )
+        for episode in range(n)
+    ]
+    try:
+        return await asyncio.gather(
+            *(simul.run_episode_async() for simul in simulations)
+        )
+    finally:
+        for simul in simulations:
+            simul.api.close()
+        if shared is not None:
+            shared.close()
+            # The fallback client is the primary one unless it has its own endpoint
+            for client in {shared.client, shared.fallback_client} - {None}:
+                await client.close()
+
+
+def run_episodes_async(
+    n, max_concurrency=None, verbose=False, stub=None, latency=0.0, seed=None
+):
+    """
+    Runs n headless episodes concurrently on a single asyncio event loop.
+
+    Args:
+        n (int): Number of episodes to run.
+        max_concurrency (int): Maximum number of LLM requests in flight. Defaults
+            to api_client.max_concurrency in configapi.json.
+        verbose (bool): If True, prints the simulation output.
+        stub (str): If set, name of the StubLLMApi policy used instead of the LLM.
+        latency (float): Artificial latency of the stub backend, in seconds.
+        seed (int): Base seed; episode i uses seed + i. Random seeds if not given.
+
+    Returns:
+        list of EpisodeResult: Results ordered by episode index.
+    """
+    return asyncio.run(
+        _run_episodes_async(n, max_concurrency, verbose, stub, latency, seed)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run headless mirror test episodes.")
+    parser.add_argument(
+        "-n", "--episodes", type=int, default=1, help="number of episodes"
+    )
+    parser.add_argument(
+        "-w", "--workers", type=int, default=None, help="worker processes"
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="print simulation output"
+    )
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="drive all episodes from one event loop",
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        default=None,
+        help="max LLM requests in flight (--async)",
+    )
+    parser.add_argument(
+        "--stub",
+        choices=sorted(POLICIES),
+        default=None,
+        help="offline scripted policy instead of the LLM",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="artificial latency of the stub backend (s)",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=None, help="base seed (episode i uses seed + i)"
+    )
+    parser.add_argument(
+        "--trajectories",
+        default=None,
+        help="append the episode trajectories to this JSONL file",
+    )
+    parser.add_argument(
+        "--metrics",
+        default=None,
+        help="write the request metrics to this file (.json or Prometheus text)",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="serve the metrics on this local port while running",
+    )
+    parser.add_argument(
+        "--trace",
+        default=None,
+        help="write per-phase timing spans to this Chrome trace JSON file",
+    )
+    parser.add_argument(
+        "--profile-dir",
+        default=None,
+        help="write cProfile stats of every episode to this folder",
+    )
+    args = parser.parse_args()
+
+    if args.trace:
+        PROFILER.enable()
+    if args.profile_dir:
+        os.makedirs(args.profile_dir, exist_ok=True)
+
+    if args.metrics_port is not None:
+        METRICS.serve(args.metrics_port)
+
+    if args.use_async:
+        # Episodes interleave on one event loop, so the whole batch is profiled at once
+        profile_path = (
+            os.path.join(args.profile_dir, "batch.prof") if args.profile_dir else None
+        )
+        with profile_to(profile_path):
+            results = run_episodes_async(
+                args.episodes,
+                max_concurrency=args.concurrency,
+                verbose=args.verbose,
+                stub=args.stub,
+                latency=args.latency,
+                seed=args.seed,
+            )
+    else:
+        results = run_episodes(
+            args.episodes,
+            workers=args.workers,
+            verbose=args.verbose,
+            stub=args.stub,
+            latency=args.latency,
+            seed=args.seed,
+            profile_dir=args.profile_dir,
+        )
+
+    if args.metrics:
+        METRICS.write(args.metrics)
+    if args.trace:
+        PROFILER.write_chrome_trace(args.trace)
+    if args.trajectories:
+        save_trajectories(
+            args.trajectories,
+            [result.trajectory for result in results if result.trajectory],
+        )
+
+    for episode, result in enumerate(results):
+        print(
+            f"episode {episode}: {result.outcome} in {result.turns} turns, "
+            f"tokens={result.tokens['total_tokens']}"
+        )
+    print("summary:", dict(Counter(result.outcome for result in results)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,80 @@
 #!/usr/bin/env python3
 import json
+import queue
 import random
-import threading
 import time
+from dataclasses import dataclass
+from dataclasses import field
 
+import numpy as np
 import pygame
-
 from api import LLMApi
-
 from characters.NPC import NPC
 from characters.player import Player
-
-from utils.generate_log import JsonLogger
+from characters.registry import AgentRegistry
+from utils.api_worker import ApiWorker
 from utils.config import mainConfig
 from utils.generate_grid import _generate_grid
+from utils.generate_log import JsonLogger
+from utils.generate_log import NullLogger
+from utils.grid_codes import AGENT_OFFSET
+from utils.grid_codes import ascii_grid
+from utils.grid_codes import code_agent
+from utils.grid_codes import DOOR
+from utils.grid_codes import EMPTY
+from utils.grid_codes import WALL
+from utils.memory import make_memory
+from utils.metrics import METRICS
+from utils.observation import make_observation
+from utils.palette import agent_color
+from utils.profiling import PROFILER
+from utils.trajectory import Trajectory
 
 cfg = mainConfig()
 cfg.read_config()
 
+# Posted by the API thread when a reply (or an error) is ready
+API_RESPONSE_EVENT = pygame.USEREVENT + 1
+
+# Posted by a timer when a failed request is due to be sent again
+API_RETRY_EVENT = pygame.USEREVENT + 2
+
+# Window events after which the whole board must be redrawn
+WINDOW_REDRAW_EVENTS = (
+    pygame.VIDEOEXPOSE,
+    pygame.WINDOWEXPOSED,
+    pygame.WINDOWRESTORED,
+    pygame.WINDOWSIZECHANGED,
+)
+
+
+@dataclass
+class EpisodeResult:
+    """
+    Summary of a finished episode, returned instead of terminating the process.
+
+    Attributes:
+        outcome (str): "success", "failure", "timeout" or "error".
+        turns (int): Number of turns played.
+        key_action_map (dict): Button to action mapping used in the episode.
+        llm_control (int): Index of the LLM-controlled character.
+        tokens (dict): Accumulated prompt/completion/total token usage.
+        log_path (str): Path of the episode log file, if any.
+        error (str): Error message when the outcome is "error".
+        seed (int): Seed of the episode random streams.
+        trajectory (Trajectory): Buttons chosen on every turn, for replay.
+    """
+
+    outcome: str
+    turns: int
+    key_action_map: dict
+    llm_control: int
+    tokens: dict = field(default_factory=dict)
+    log_path: str = None
+    error: str = None
+    seed: int = None
+    trajectory: Trajectory = None
+
 
 class Simulation:
     """
@@ -25,39 +82,74 @@ class Simulation:
     Handles initialization, main loop, event handling, rendering, and game logic.
     """
 
-    COLORS = {
-        1: (255, 0, 0),  # Red
-        2: (0, 255, 0),  # Green
-        3: (0, 0, 255),  # Blue
-        4: (255, 255, 0),  # Yellow
-        5: (255, 165, 0),  # Orange
-        6: (128, 0, 128),  # Purple
-        7: (0, 255, 255),  # Cyan
-        8: (255, 192, 203),  # Pink
-        9: (255, 140, 0),  # Dark Orange
-    }
-
-    def __init__(self):
+    MAX_API_FAILURES = 5  # Consecutive failed requests before main_loop gives up
+
+    def __init__(
+        self,
+        headless=False,
+        api=None,
+        config=None,
+        log_name=None,
+        verbose=True,
+        seed=None,
+        log=True,
+    ):
         """
         Initializes the simulation, loads configuration, creates grid and characters
+
+        Args:
+            headless (bool): If True, no Pygame window is created and the episode
+                is driven with run_episode() instead of main_loop().
+            api (LLMApi): API backend to use. Defaults to LLMApi('configapi.json').
+            config (dict): Configuration overriding the one read from config.yaml.
+            log_name (str): Optional log file name (used to keep parallel episodes
+                apart).
+            verbose (bool): If False, suppresses console output.
+            seed (int): Seed of the episode. A random one is drawn if not given.
+            log (bool): If False, no log file is written.
         """
+        self.headless = headless
+        self.verbose = verbose
+        self.config = config if config is not None else cfg.config
+
+        # Independent random streams for the episode setup and the NPC moves,
+        # so the episode can be rebuilt from its seed and chosen buttons
+        self.seed = seed if seed is not None else random.randrange(2**32)
+        self.rng = random.Random(f"{self.seed}:setup")
+        self.npc_rng = random.Random(f"{self.seed}:npc")
+        self.trajectory = Trajectory(
+            self.seed, {key: self.config[key] for key in ("game", "screen")}
+        )
+
         self.turn = 1  # Current turn number
-        self.memory = []  # Stores actions and thoughts for each turn
+        # Stores actions and thoughts for each turn
+        self.memory = make_memory(self.config.get("memory"))
         self.memory_positions = []
         self.memory_ascii = []
-        self.Logger = JsonLogger()
+        if log:
+            self.Logger = JsonLogger(
+                file_name=log_name,
+                model_name=getattr(api, "model", None),
+                **self.config.get("logging", {}),
+            )
+        else:
+            self.Logger = NullLogger()
 
-        
-        self.characters_original = []  # Original characters list for reference
         self.door_state = "closed"  # Door can be "open" or "closed"
         self.data = {}
-        
-        # Threading variables for API calls
-        self.api_thread = None
-        self.api_response = None
+        self.outcome = (
+            None  # "success", "failure", "timeout" or "error" once the episode ends
+        )
+        self.tokens = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        self.last_usage = None  # Usage of the latest reply, written to the log
+
+        # API worker used by main_loop, and the id of the request it waits for
+        self.worker = None
+        self.request_id = 0
         self.waiting_for_api = False
-        self.api_request_data = None
-        
+        self.api_failures = 0  # Consecutive failed requests of the current turn
+        self.ended = False  # True once the end record is written (see result)
+
         actions = [
             "move_left",
             "move_right",
@@ -66,21 +158,28 @@ class Simulation:
             "open_door",
             "close_door",
         ]
-        #keys = [pygame.K_1, pygame.K_2, pygame.K_3, pygame.K_4, pygame.K_5, pygame.K_6]
+        # keys = [pygame.K_1, pygame.K_2, pygame.K_3, pygame.K_4, pygame.K_5, pygame.K_6]
         keys = ["btn1", "btn2", "btn3", "btn4", "btn5", "btn6"]
-        random.shuffle(actions)
+        self.rng.shuffle(actions)
 
         self.key_action_map = dict(zip(keys, actions))
-        print("button actions: ", self.key_action_map)
+        self._print("button actions: ", self.key_action_map)
 
         self._load_config()  # Load configuration values
+        # Encodes the current state
+        self.observation = make_observation(
+            self.config.get("observation"), self.characters_num
+        )
         self._init_grid_and_characters()  # Create grid and characters
-        self._init_pygame()  # Initialize Pygame window and clock
+        self._log_header()
+        if not self.headless:
+            self._init_pygame()  # Initialize Pygame window and clock
 
-        self.api = LLMApi('configapi.json')  # Initialize LLM API
+        # Initialize LLM API
+        self.api = api if api is not None else LLMApi("configapi.json")
+        self._owns_api = api is None  # Closed with the episode if created here
 
         # Your goal is to help the agents exit through the door.
-            
 
         self.api.setInitialContext(
             """
@@ -90,14 +189,14 @@ class Simulation:
             After each step, think out loud about the previous state and next actions then choose the next button.
             Please respond only with a JSON string matching this schema.
             Do not include any explanations, thoughts, or markdown.
-        
-            You will create a key action map to assign each of the six buttons to specific actions. 
+
+            You will create a key action map to assign each of the six buttons to specific actions.
             explaining how each button corresponds to its chosen action.
             you can check the key action map is correct by pressing the buttons and see if the actions are performed as expected. if not, you need to change the key action map.
             explain all the buttons and put your hypothesis about the key action map.
-            
+
             Check the movements of ALL the agents and the door, then reason about the next action to take and make a choice.
-            
+
             your goal is exit through the door.
             The buttons possible actions are:
             - move_left
@@ -105,66 +204,74 @@ class Simulation:
             - move_up
             - move_down
             - open_door
-            - close_door 
-            you have to choose the correct action for each button.  
-            
+            - close_door
+            you have to choose the correct action for each button.
+
             if you press the same button 5 times, make sure your key action map is correct. because probably you are not pressing the correct button. Press the same button continuously is a bad practice.
-            
+
             Below you will see a memory of previous states and actions taken.
             This memory is broken into turns.
             Reason about the previous states and actions taken and collect your thoughts
             and based on those thought reason about the next action to take and make a choice.
             """
+            + self._observation_context()
         )
 
-    def request_action_threaded(self, data):
+    def _observation_context(self):
         """
-        Makes API request in a separate thread to avoid blocking the interface
+        Returns the explanation of the observation encoding added to the initial
+        context, on its own line (empty for the full encoding).
         """
-        def api_call():
-            try:
-                self.api.generate(msg=data)
-                response = self.api.request()
-                self.api_response = response
-                self.waiting_for_api = False
-            except Exception as e:
-                print(f"API Error: {e}")
-                self.api_response = None
-                self.waiting_for_api = False
+        description = self.observation.description
+        return f"\n{description}\n" if description else ""
 
-        self.waiting_for_api = True
-        self.api_response = None
-        self.api_thread = threading.Thread(target=api_call)
-        self.api_thread.daemon = True  # Thread will be terminated when main program ends
-        self.api_thread.start()
+    def _print(self, *args):
+        """
+        Prints to the console unless the simulation runs quietly.
+        """
+        if self.verbose:
+            print(*args)
 
     def request_action(self, data):
         """
-        Original method maintained for compatibility, but now uses threading
+        Submits the API request to the worker thread to avoid blocking the interface.
+        Only the result of the latest request is processed (see _handle_api_results).
         """
-        self.request_action_threaded(data)
+        self.request_id += 1
+        self.waiting_for_api = True
+        self.worker.submit(self.request_id, data)
 
         # self._print_ascii_grid()  # Uncomment to print grid in ASCII
 
+    def _add_usage(self, usage):
+        """
+        Accumulates the token usage reported by the API for the episode.
+        """
+        self.last_usage = usage
+        if usage is None:
+            return
+        for key in self.tokens:
+            self.tokens[key] += getattr(usage, key, 0) or 0
+
     def _load_config(self):
         """
         Loads configuration values from the config file and sets simulation parameters.
         """
         # Add 2 to grid size for borders
-        self.x_grid_max = cfg.config["screen"]["x_grid_max"] + 2
-        self.y_grid_max = cfg.config["screen"]["y_grid_max"] + 2
-        self.square_tam = cfg.config["screen"]["square_tam"]
-        self.door_size = cfg.config["game"]["door_size"]
-
-        self.characters_num = cfg.config["game"]["characters_num"]
+        self.x_grid_max = self.config["screen"]["x_grid_max"] + 2
+        self.y_grid_max = self.config["screen"]["y_grid_max"] + 2
+        self.square_tam = self.config["screen"]["square_tam"]
+        self.door_size = self.config["game"]["door_size"]
+        # The turn cap only applies to headless episodes; None means no limit
+        self.max_turns = self.config["game"].get("max_turns") if self.headless else None
+
+        self.characters_num = self.config["game"]["characters_num"]
         self._check_config()
 
         # Randomly select which character is player-controlled
-        self.controlable_character = random.randint(0, self.characters_num - 1)
-        self.BALL_RADIUS = self.square_tam // 2 - cfg.config["screen"]["space_tam"]
-        
-        self.Logger.log_main_data(self.controlable_character, self.key_action_map)
-
+        self.controlable_character = self.rng.randint(0, self.characters_num - 1)
+        self.BALL_RADIUS = self.square_tam // 2 - self.config["screen"]["space_tam"]
+        self.fps = self.config["screen"].get("fps", 60)  # Frame cap of the window
 
     def _init_grid_and_characters(self):
         """
@@ -172,30 +279,33 @@ class Simulation:
         """
         # Generate grid and get initial positions for all characters
         self.mainGrid, positions = _generate_grid(
-            self.y_grid_max, self.x_grid_max, self.characters_num, self.door_size
+            self.y_grid_max,
+            self.x_grid_max,
+            self.characters_num,
+            self.door_size,
+            rng=self.rng,
         )
 
-        self.characters = []
+        self.characters = AgentRegistry(self.characters_num)
         for idx, pos in enumerate(positions):
-            color = self.COLORS[idx + 1]  # Assign color to each character
+            color = agent_color(idx)  # Assign color to each character
 
             if idx == self.controlable_character:
                 # Create player-controlled character
-                print("LLM control:", color, self.controlable_character)
-                
-                self.characters.append(
-                    Player(
-                        idx,
-                        pos,
-                        color,
-                        self.BALL_RADIUS,
-                        self.square_tam,
-                        self.door_state,
-                    )
+                self._print("LLM control:", color, self.controlable_character)
+
+                player = Player(
+                    idx,
+                    pos,
+                    color,
+                    self.BALL_RADIUS,
+                    self.square_tam,
+                    self.door_state,
                 )
+                self.characters.add(player, player=True)
             else:
                 # Create NPC character
-                self.characters.append(
+                self.characters.add(
                     NPC(
                         idx,
                         pos,
@@ -206,85 +316,402 @@ class Simulation:
                     )
                 )
 
-        self.characters_original = self.characters.copy()
+        # Characters changed since the last logged turn
+        self.log_changes = self.characters.track()
 
     def main_loop(self):
         """
         Main game loop. Handles events, updates game state, and renders the grid.
         """
         running = True
-        self.generate_JSON(action="start", prev_reasoning="", next_reasoning="")  # Initial state
-        
+        # Initial state
+        self.generate_JSON(action="start", prev_reasoning="", next_reasoning="")
+
+        # The worker wakes up the loop through a Pygame event for every result
+        self.worker = ApiWorker(
+            self.api,
+            on_result=lambda: pygame.event.post(pygame.event.Event(API_RESPONSE_EVENT)),
+        )
+
         # Start the first API request
         self.request_action(self.json_data)
-        
+
+        self.render_grid()
+
         while running:
-            # Handle Pygame events
-            for event in pygame.event.get():
+            # Block until something happens, then handle every pending event
+            events = [pygame.event.wait()] + pygame.event.get()
+            changed = False
+
+            for event in events:
                 if event.type == pygame.QUIT:
                     running = False
-                    
-            # Check if we have an API response ready
-            if not self.waiting_for_api and self.api_response is not None:
-                self.process_api_response()
-                
-            # Continue rendering even while waiting for API
-            self.render_grid()
-            
-            # Small delay to avoid overloading CPU
-            time.sleep(0.016)  # ~60 FPS
-
-    def process_api_response(self):
-        """
-        Processes API response when it's ready
-        """
-        reply = self.api_response
-        self.api_response = None  # Reset for next request
-        
+
+                elif event.type in WINDOW_REDRAW_EVENTS:
+                    self.redraw_all = True
+                    changed = True
+
+                # Check if we have an API response ready
+                elif event.type == API_RESPONSE_EVENT:
+                    changed |= self._handle_api_results()
+
+                    if self.outcome is not None:
+                        print(self._outcome_message())
+                        self.result()  # Writes the end record
+                        running = False
+
+                # A failed request is due to be sent again
+                elif event.type == API_RETRY_EVENT:
+                    self.request_action(self.json_data)
+
+            # Redraw only when the state or the window changed
+            if changed:
+                self.render_grid()
+                self.clock.tick(self.fps)  # Frame cap
+
+        # Don't wait for an in-flight request on quit
+        self.worker.shutdown()
+        self._close_api()
+        self.Logger.close()
+
+    def _handle_api_results(self):
+        """
+        Processes the results queued by the API worker. Results of requests other
+        than the latest one are ignored, so no turn is processed twice.
+
+        Returns:
+            bool: True if a turn was processed.
+        """
+        processed = False
+        while self.waiting_for_api:
+            try:
+                result = self.worker.results.get_nowait()
+            except queue.Empty:
+                break
+            if result.request_id != self.request_id:
+                continue  # Stale result
+
+            self.waiting_for_api = False
+            if result.error is not None:
+                self._handle_api_error(result.error)
+                continue
+
+            self.api_failures = 0
+            self._add_usage(result.usage)
+            self.process_api_response(result.reply)
+            processed = True
+
+            if self.outcome is None:
+                # Start next API request
+                self.request_action(self.json_data)
+        return processed
+
+    def _handle_api_error(self, error):
+        """
+        Asks again for the same turn after a backoff delay, or ends the episode
+        with the "error" outcome (like run_episode) after MAX_API_FAILURES
+        consecutive failures.
+        """
+        self._print(f"API Error: {error}")
+        self.api_failures += 1
+        if self.api_failures >= self.MAX_API_FAILURES:
+            self.outcome = "error"
+            self.result(error=str(error))
+            return
+
+        METRICS.inc("api_resubmits_total", model=self.api.model)
+        delay = self.api.retry.delay(self.api_failures - 1)
+        # The timer fires once, after at least 1 ms
+        pygame.time.set_timer(API_RETRY_EVENT, max(1, int(delay * 1000)), loops=1)
+
+    def run_episode(self):
+        """
+        Runs a whole episode synchronously, without Pygame, until it ends.
+
+        Returns:
+            EpisodeResult: The outcome of the episode.
+        """
+        # Initial state
+        self.generate_JSON(action="start", prev_reasoning="", next_reasoning="")
+
+        try:
+            while self.outcome is None:
+                self.api.generate(msg=self.json_data)
+                reply = self.api.request()
+                self._add_usage(self.api.last_usage)
+                self.process_api_response(reply)
+        except Exception as e:
+            self._print(f"API Error: {e}")
+            return self.result(outcome="error", error=str(e))
+
+        self._print(self._outcome_message())
+        return self.result()
+
+    async def run_episode_async(self):
+        """
+        Runs a whole episode without Pygame using an asyncio API backend
+        (AsyncLLMApi), so one event loop can drive many episodes at once.
+
+        Returns:
+            EpisodeResult: The outcome of the episode.
+        """
+        # Initial state
+        self.generate_JSON(action="start", prev_reasoning="", next_reasoning="")
+
+        try:
+            while self.outcome is None:
+                self.api.generate(msg=self.json_data)
+                reply = await self.api.request()
+                self._add_usage(self.api.last_usage)
+                self.process_api_response(reply)
+        except Exception as e:
+            self._print(f"API Error: {e}")
+            return self.result(outcome="error", error=str(e))
+
+        self._print(self._outcome_message())
+        return self.result()
+
+    def result(self, outcome=None, error=None):
+        """
+        Builds the EpisodeResult for the current state of the episode. The
+        first call ends the episode: it writes the end record and closes the
+        logger and the API.
+        """
+        outcome = outcome or self.outcome
+        if not self.ended:
+            self.ended = True
+            self.trajectory.outcome = outcome
+            self.Logger.log(
+                "end",
+                outcome=outcome,
+                turns=self.turn - 1,
+                tokens=dict(self.tokens),
+                error=error,
+            )
+            self.Logger.close()  # The episode is over, write the pending records
+            self._close_api()
+        return EpisodeResult(
+            outcome=outcome,
+            turns=self.turn - 1,
+            key_action_map=dict(self.key_action_map),
+            llm_control=self.controlable_character,
+            tokens=dict(self.tokens),
+            log_path=self.Logger.log_path,
+            error=error,
+            seed=self.seed,
+            trajectory=self.trajectory,
+        )
+
+    def _close_api(self):
+        """
+        Closes the API backend if the simulation created it.
+        """
+        if self._owns_api:
+            self.api.close()
+
+    def _outcome_message(self):
+        messages = {
+            "success": "YOU WIN!",
+            "failure": "YOU LOSE!",
+            "timeout": "TIME OUT!",
+            "error": "API ERROR!",
+        }
+        return messages.get(self.outcome, "")
+
+    @PROFILER.traced("simulation.process_api_response")
+    def process_api_response(self, reply):
+        """
+        Processes an API reply: validates it, applies the chosen action and
+        prepares the JSON for the next turn.
+
+        Args:
+            reply (str): Raw text returned by the LLM.
+        """
         reply = reply.replace("```json", "")
-        reply = reply.replace("```", "")                
-        
-        print("Reply received: ", reply)
-        print("-" * 120)
+        reply = reply.replace("```", "")
+
+        self._print("Reply received: ", reply)
+        self._print("-" * 120)
 
+        turn = self.turn
         self.turn += 1
-        
+        METRICS.observe(
+            "turn_seconds",
+            time.perf_counter() - self.turn_started,
+            model=self.api.model,
+        )
+
         try:
             response = json.loads(reply)
-        except Exception as e:
-            self.generate_JSON("format error", "response sent in invalid format, response must be sent in json format  do not send complementary text only JSON in this format")
-           
-            # Start new API request
-            self.request_action(self.json_data)
+        except Exception:
+            self._reject_reply(
+                turn,
+                reply,
+                "format error",
+                "response sent in invalid format, response must be sent in json format  do not send complementary text only JSON in this format",
+            )
             return
-        
+
         # Verify if the response contains all required fields
-        required_fields = ["choice", "prev_reasoning", "next_reasoning", "key_action_map"]
-        if not all(field in response for field in required_fields):
-            print("Invalid response format. Missing required fields.")
-            self.generate_JSON("format error", "response sent in invalid format, response must be sent in json format  do not send complementary text only JSON in this format")
-            # Start new API request
-            self.request_action(self.json_data)
+        required_fields = [
+            "choice",
+            "prev_reasoning",
+            "next_reasoning",
+            "key_action_map",
+        ]
+        if not isinstance(response, dict) or not all(
+            field in response for field in required_fields
+        ):
+            self._print("Invalid response format. Missing required fields.")
+            self._reject_reply(
+                turn,
+                reply,
+                "format error",
+                "response sent in invalid format, response must be sent in json format  do not send complementary text only JSON in this format",
+            )
             return
-            
+
         # Verify if choice is one of the valid buttons
         valid_choices = ["btn1", "btn2", "btn3", "btn4", "btn5", "btn6"]
         if response["choice"] not in valid_choices:
-            print(f"Invalid choice: {response['choice']}. Must be one of: {valid_choices}")
-            self.generate_JSON("choice error", f"choice must be exactly one of: {valid_choices}. You sent: {response['choice']}")
-            # Start new API request
-            self.request_action(self.json_data)
+            self._print(
+                f"Invalid choice: {response['choice']}. Must be one of: {valid_choices}"
+            )
+            self._reject_reply(
+                turn,
+                reply,
+                "choice error",
+                f"choice must be exactly one of: {valid_choices}. "
+                f"You sent: {response['choice']}",
+            )
             return
-        
-        self.Logger.log(self.json_data, reply)
-        
-        self._handle_action(response["choice"])
-        self._move_npcs()     # Move all NPCs
-        self.generate_JSON(response["choice"], response["prev_reasoning"], response["next_reasoning"], response["key_action_map"])
-
-        # Start next API request
-        self.request_action(self.json_data)
 
+        self.trajectory.append(response["choice"])
+        self.step(response["choice"])
+        self.Logger.log(
+            "turn",
+            turn=turn,
+            choice=response["choice"],
+            llm=response,
+            usage=self._usage_dict(),
+            **self._state_delta(),
+        )
+        if self.outcome is not None:
+            return
+
+        self.generate_JSON(
+            response["choice"],
+            response["prev_reasoning"],
+            response["next_reasoning"],
+            response["key_action_map"],
+        )
+        self._check_timeout()
+
+    def _reject_reply(self, turn, reply, error, message):
+        """
+        Handles a reply that can't be applied: the turn is spent without any action
+        and the error is reported to the LLM on the next turn.
+
+        Args:
+            turn (int): The turn the reply answered.
+            reply (str): The raw reply.
+            error (str): "format error" or "choice error".
+            message (str): Explanation sent to the LLM.
+        """
+        self.trajectory.append(None)
+        METRICS.inc("llm_parse_failures_total", model=self.api.model, error=error)
+        self.Logger.log(
+            "error",
+            turn=turn,
+            error=error,
+            message=message,
+            llm=reply,
+            usage=self._usage_dict(),
+        )
+        self.generate_JSON(error, message)
+        self._check_timeout()
+
+    def _usage_dict(self):
+        if self.last_usage is None:
+            return None
+        return {key: getattr(self.last_usage, key, 0) or 0 for key in self.tokens}
+
+    def _log_header(self):
+        """
+        Logs the fixed data of the episode: the grid without agents and the initial
+        state.
+        """
+        static_grid = np.where(self.mainGrid >= AGENT_OFFSET, EMPTY, self.mainGrid)
+        self.logged_door_state = self.door_state
+        self.Logger.log_header(
+            self.controlable_character,
+            self.key_action_map,
+            seed=self.seed,
+            config={
+                key: self.config[key]
+                for key in ("game", "screen", "memory", "observation")
+                if key in self.config
+            },
+            grid=ascii_grid(static_grid, 0),
+            agents=[[char.idx, char.pos[1], char.pos[0]] for char in self.characters],
+            door=self.door_state,
+        )
+
+    def _state_delta(self):
+        """
+        Returns what changed since the last logged state: the agents that moved
+        ([id, x, y]), the agents that exited and the new door state.
+        """
+        moved, exited = [], []
+        for idx in sorted(self.log_changes):
+            if self.characters.is_alive(idx):
+                char = self.characters.get(idx)
+                moved.append([idx, char.pos[1], char.pos[0]])
+            else:
+                exited.append(idx)
+        self.log_changes.clear()
+
+        delta = {"moved": moved}
+        if exited:
+            delta["exited"] = exited
+        if self.door_state != self.logged_door_state:
+            delta["door"] = self.door_state
+            self.logged_door_state = self.door_state
+        return delta
+
+    def step(self, choice):
+        """
+        Applies a valid button press: the player action, then the NPC moves.
+
+        Args:
+            choice (str): The pressed button.
+        """
+        self._handle_action(choice)
+        if self.outcome is None:
+            self._move_npcs()  # Move all NPCs
+
+    def replay_turn(self, choice):
+        """
+        Replays one recorded turn without building any prompt.
+
+        Args:
+            choice (str): The pressed button, or None if the reply was rejected.
+        """
+        self.turn += 1
+        self.trajectory.append(choice)
+        if choice is not None:
+            self.step(choice)
+        if self.outcome is None:
+            self._check_timeout()
+
+    def _check_timeout(self):
+        """
+        Ends the episode when the configured maximum number of turns is exceeded.
+        """
+        if self.max_turns is not None and self.turn > self.max_turns:
+            self.outcome = "timeout"
+
+    @PROFILER.traced("simulation._handle_action")
     def _handle_action(self, choice):
         """
         Handles randomized keyboard input events.
@@ -295,26 +722,20 @@ class Simulation:
         Returns:
             bool: True if a valid action was performed, False otherwise.
         """
-        index_ajustable = self.controlable_character
-        for i in range(self.controlable_character):
-            if self.characters_original[i] not in self.characters:
-                index_ajustable -= 1
-        player = self.characters[index_ajustable]
+        player = self.characters.player
 
         action = self.key_action_map.get(choice)
         new_pos = player.get_move(action)
 
         if new_pos:
-            if (
-                self.mainGrid[new_pos[0], new_pos[1]] == "D"
+            exits = (
+                self.mainGrid[new_pos[0], new_pos[1]] == DOOR
                 and self.door_state == "open"
-            ):
-                player.move(self.mainGrid, new_pos, self.door_state)
-                print("YOU WIN!" if len(self.characters) == 1 else "YOU LOSE!")
-                pygame.quit()
-                exit()
-            else:
-                player.move(self.mainGrid, new_pos, self.door_state)
+            )
+            if player.move(self.mainGrid, new_pos, self.door_state):
+                self.characters.moved(player.idx)
+            if exits:
+                self.outcome = "success" if len(self.characters) == 1 else "failure"
             return True
 
         elif action == "open_door":
@@ -327,45 +748,46 @@ class Simulation:
 
         return False
 
+    @PROFILER.traced("simulation._move_npcs")
     def _move_npcs(self):
         """
         Moves all NPCs randomly. Removes NPCs that reach the open door.
         """
-        npcs_to_remove = []
-        for idx, char in enumerate(self.characters):
-
-            if type(self.characters[idx]) == NPC:
-                npc = char
-                new_pos = npc.get_random_move(self.mainGrid)
-
-                # If NPC reaches the open door, remove it from the game
-                if (
-                    self.mainGrid[new_pos[0], new_pos[1]] == "D"
-                    and self.door_state == "open"
-                ):
-                    self.mainGrid[npc.pos] = "."
-                    npcs_to_remove.append(npc)
-                else:
-                    npc.move(self.mainGrid, new_pos, self.door_state)
-
-        # Remove NPCs that exited through the door
-        for npc in npcs_to_remove:
-            self.characters.remove(npc)
-
-    def generate_JSON(self, action=None, prev_reasoning="", next_reasoning="", key_action_map=""):
+        grid = self.mainGrid
+        player = self.characters.player
+        door_open = self.door_state == "open"
+        exited = []
+        for npc in self.characters:
+            if npc is player:
+                continue
+            new_pos = npc.get_random_move(grid, self.npc_rng)
+
+            # If NPC reaches the open door, remove it from the game
+            if door_open and grid[new_pos[0], new_pos[1]] == DOOR:
+                grid[npc.pos] = EMPTY
+                exited.append(npc)
+            elif npc.move(grid, new_pos, self.door_state):
+                self.characters.moved(npc.idx)
+
+        # Remove the NPCs that exited, last ones first (see AgentRegistry.remove)
+        for npc in reversed(exited):
+            self.characters.remove(npc.idx)
+
+    @PROFILER.traced("simulation.generate_JSON")
+    def generate_JSON(
+        self, action=None, prev_reasoning="", next_reasoning="", key_action_map=""
+    ):
         agents_position = [
-                {"id": char.idx, "x": char.pos[1], "y": char.pos[0]}
-                for char in self.characters
-            ]
-    
+            {"id": char.idx, "x": char.pos[1], "y": char.pos[0]}
+            for char in self.characters
+        ]
+
         # Build the data dictionary representing the current state
         self.data = {
-            "previous_turn_memory": self.memory,    
             "current_turn": self.turn,
             "current_door_state": self.door_state,
-            "current_agents_positions": agents_position,
-            "current_grid_ascii": ["".join(row) for row in self.mainGrid.tolist()],
-            #"button_map": ["btn1", "btn2", "btn3", "btn4", "btn5", "btn6"],
+            **self.observation.encode(agents_position, self.mainGrid),
+            # "button_map": ["btn1", "btn2", "btn3", "btn4", "btn5", "btn6"],
             # "key_action_map": key_action_map,
         }
 
@@ -376,52 +798,115 @@ class Simulation:
                 "key_action_map": key_action_map,
                 "turn_next_reasoning": next_reasoning,
             }
-            self.memory[self.turn-2].update(llm_data)
+            self.memory.update_last(llm_data)
 
-        self.json_data = json.dumps(self.data, indent=2)
+        # Memory entries are kept encoded, only the current state is serialized here
+        state_json = json.dumps(self.data, ensure_ascii=False, separators=(",", ":"))
+        self.json_data = (
+            '{"previous_turn_memory":' + self.memory.to_json() + "," + state_json[1:]
+        )
 
-        self.memory.append({"turn": self.turn, "turn_door_state": self.door_state, "agents_positions_on_turn": [agents_position]})
-                
-    def render_grid(self):
+        self.memory.add_turn(self.turn, self.door_state, agents_position)
+        # The turn JSON is ready, waiting for the reply
+        self.turn_started = time.perf_counter()
+
+    def _cell_rect(self, y, x):
+        return pygame.Rect(
+            x * self.square_tam,
+            y * self.square_tam,
+            self.square_tam,
+            self.square_tam,
+        )
+
+    def _build_static_layer(self):
         """
-        Renders the grid and all characters on the Pygame window.
+        Pre-renders the parts of the board that never change (background, walls,
+        closed door and empty cell borders) to a cached Surface.
         """
-        self.screen.fill((30, 30, 30))  # Fill background
+        self.static_layer = pygame.Surface(self.screen.get_size())
+        self.static_layer.fill((30, 30, 30))  # Fill background
 
         # Draw grid cells
         for y in range(self.y_grid_max):
             for x in range(self.x_grid_max):
-                char = self.mainGrid[y, x]
-                rect = pygame.Rect(
-                    x * self.square_tam,
-                    y * self.square_tam,
-                    self.square_tam,
-                    self.square_tam,
-                )
+                cell = self.mainGrid[y, x]
+                rect = self._cell_rect(y, x)
 
-                if char == "#":
+                if cell == WALL:
                     # Draw wall cell
-                    pygame.draw.rect(self.screen, (100, 100, 100), rect)
-                elif char == "D":
+                    pygame.draw.rect(self.static_layer, (100, 100, 100), rect)
+                elif cell == DOOR:
                     # Draw door cell
-                    pygame.draw.rect(self.screen, (127, 127, 127), rect)
-                    if self.door_state == "open":
-                        # Draw open door effect
-                        dif = self.square_tam // 3
-                        rect2 = pygame.Rect(
-                            x * self.square_tam + dif // 2,
-                            y * self.square_tam + dif // 2,
-                            self.square_tam - dif,
-                            self.square_tam - dif,
-                        )
-                        pygame.draw.rect(self.screen, (160, 160, 160), rect2)
+                    pygame.draw.rect(self.static_layer, (127, 127, 127), rect)
                 else:
                     # Draw empty cell border
-                    pygame.draw.rect(self.screen, (50, 50, 50), rect, 1)
+                    pygame.draw.rect(self.static_layer, (50, 50, 50), rect, 1)
+
+        # Door cells are kept apart: a character on the door hides it in the grid
+        self.door_cells = {
+            (int(y), int(x)) for y, x in zip(*np.nonzero(self.mainGrid == DOOR))
+        }
+
+    def _draw_cell(self, y, x):
+        """
+        Restores a cell from the static layer and draws the open door effect on it.
+        """
+        rect = self._cell_rect(y, x)
+        self.screen.blit(self.static_layer, rect, rect)
+
+        if (y, x) in self.door_cells and self.door_state == "open":
+            # Draw open door effect
+            dif = self.square_tam // 3
+            rect2 = pygame.Rect(
+                x * self.square_tam + dif // 2,
+                y * self.square_tam + dif // 2,
+                self.square_tam - dif,
+                self.square_tam - dif,
+            )
+            pygame.draw.rect(self.screen, (160, 160, 160), rect2)
+        return rect
+
+    @PROFILER.traced("simulation.render_grid")
+    def render_grid(self):
+        """
+        Renders the grid and all characters on the Pygame window.
 
-        # Draw all characters (player and NPCs)
-        for char in self.characters:
-            char.draw(self.screen)
+        The first frame (or one after redraw_all is set) draws the whole board;
+        later frames only redraw the cells of the characters that changed since
+        the last frame (see AgentRegistry.track) and update those rectangles on
+        the display.
+        """
+        if self.static_layer is None or self.redraw_all:
+            if self.static_layer is None:
+                self._build_static_layer()
+            self.redraw_all = True
+            self.screen.blit(self.static_layer, (0, 0))
+            dirty_cells = set(self.door_cells)
+            self.drawn_positions = {char.idx: char.pos for char in self.characters}
+        else:
+            dirty_cells = set()
+            for idx in self.render_changes:
+                old = self.drawn_positions.pop(idx, None)
+                if old is not None:
+                    dirty_cells.add(old)
+                if self.characters.is_alive(idx):
+                    new = self.drawn_positions[idx] = self.characters.get(idx).pos
+                    dirty_cells.add(new)
+            if self.door_state != self.drawn_door_state:
+                dirty_cells.update(self.door_cells)
+        self.render_changes.clear()
+
+        dirty_rects = [self._draw_cell(y, x) for y, x in dirty_cells]
+
+        # Draw the characters (player and NPCs) standing on redrawn cells
+        if self.redraw_all:
+            for char in self.characters:
+                char.draw(self.screen)
+        else:
+            for y, x in dirty_cells:
+                idx = code_agent(int(self.mainGrid[y, x]))
+                if idx is not None:
+                    self.characters.get(idx).draw(self.screen)
 
         # # Visual indicator when waiting for API
         # if self.waiting_for_api:
@@ -429,29 +914,34 @@ class Simulation:
         #     current_time = time.time()
         #     pulse = int((current_time * 3) % 2)  # Pulses every ~0.33 seconds
         #     color = (255, 255, 0) if pulse else (255, 255, 100)  # Pulsing yellow
-            
+
         #     pygame.draw.circle(
-        #         self.screen, 
-        #         color, 
-        #         (self.x_grid_max * self.square_tam - 30, 30), 
+        #         self.screen,
+        #         color,
+        #         (self.x_grid_max * self.square_tam - 30, 30),
         #         15
         #     )
-            
+
         #     # "API" text in the center of the circle
         #     font = pygame.font.Font(None, 24)
         #     text = font.render("API", True, (0, 0, 0))
         #     text_rect = text.get_rect(center=(self.x_grid_max * self.square_tam - 30, 30))
         #     self.screen.blit(text, text_rect)
 
-        pygame.display.flip()  # Update the display
-        self.clock.tick(60)  # Limit to 60 FPS
+        if self.redraw_all:
+            pygame.display.flip()  # Update the whole display
+        elif dirty_rects:
+            pygame.display.update(dirty_rects)  # Update only the changed cells
+
+        self.redraw_all = False
+        self.drawn_door_state = self.door_state
 
     def _print_ascii_grid(self):
         """
         Prints the current grid state as ASCII characters to the console.
         """
-        for row in self.mainGrid:
-            print(" ".join(row))
+        for row in ascii_grid(self.mainGrid, self.characters_num, sep=" "):
+            print(row)
         print("\n")
 
     def _init_pygame(self):
@@ -467,6 +957,14 @@ class Simulation:
         pygame.display.set_caption("Grid with Moving Balls - LLM Control")
         self.clock = pygame.time.Clock()
 
+        # Rendering cache (see render_grid)
+        self.static_layer = None
+        self.door_cells = set()
+        self.redraw_all = True
+        self.drawn_positions = {}
+        self.render_changes = self.characters.track()
+        self.drawn_door_state = None
+
     def _check_config(self):
         """
         Checks if the configuration values are valid for the simulation.
@@ -481,11 +979,6 @@ class Simulation:
         if self.characters_num < 1:
             raise ValueError("Number of characters must be at least 1.")
 
-        if self.characters_num > 9:
-            raise ValueError(
-                "Number of characters must be 9 or less to fit in the grid."
-            )
-
         if self.door_size % 2 == 0:
             raise ValueError("Door size must be an odd number.")
 
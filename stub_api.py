@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+from collections import defaultdict
+from types import SimpleNamespace
+
+from api import LLMApi
+from utils.observation import ObservationDecoder
+from utils.profiling import PROFILER
+
+BUTTONS = ["btn1", "btn2", "btn3", "btn4", "btn5", "btn6"]
+
+# (dx, dy) displacement of each move action, in the x/y of the agents positions
+MOVES = {
+    "move_left": (-1, 0),
+    "move_right": (1, 0),
+    "move_up": (0, -1),
+    "move_down": (0, 1),
+}
+
+
+class Policy:
+    """
+    Base class of the scripted policies used by StubLLMApi.
+    """
+
+    def act(self, observation: dict) -> dict:
+        """
+        Chooses the next button.
+
+        Args:
+            observation (dict): The current turn JSON sent to the LLM, in the
+                full observation encoding (see utils.observation).
+
+        Returns:
+            dict: Reply fields, at least "choice". Missing fields are filled by
+            StubLLMApi.
+        """
+        raise NotImplementedError
+
+
+class RandomButtonPolicy(Policy):
+    """
+    Presses a uniformly random button every turn.
+    """
+
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+
+    def act(self, observation):
+        return {"choice": self.rng.choice(BUTTONS)}
+
+
+class FixedSequencePolicy(Policy):
+    """
+    Presses the buttons of a fixed sequence, cycling through it.
+    """
+
+    def __init__(self, sequence=None):
+        self.sequence = sequence or BUTTONS
+        self.step = 0
+
+    def act(self, observation):
+        choice = self.sequence[self.step % len(self.sequence)]
+        self.step += 1
+        return {"choice": choice}
+
+
+class MappingOraclePolicy(Policy):
+    """
+    Learns the button mapping from the observed outcomes, like the LLM should.
+
+    Door buttons are found from door state changes. For the move buttons, the
+    displacement of every agent after each press is counted: the controlled
+    agent always moves the same way for a given button while NPCs move at
+    random, so the agent with the most consistent displacements is taken as
+    self. Once the mapping is known the policy keeps the door open until all
+    NPCs have exited, then walks to the door.
+    """
+
+    def __init__(self, explore_presses=3, seed=None):
+        self.explore_presses = explore_presses
+        self.rng = random.Random(seed)
+        self.presses = Counter()
+        # button -> agent -> displacement
+        self.votes = defaultdict(lambda: defaultdict(Counter))
+        self.door_buttons = {}  # action -> button
+        self.previous = None
+        self.last_choice = None
+
+    def act(self, observation):
+        positions = {
+            agent["id"]: (agent["x"], agent["y"])
+            for agent in observation["current_agents_positions"]
+        }
+        door_state = observation["current_door_state"]
+        self._learn(positions, door_state)
+        self.previous = (positions, door_state)
+
+        choice = self._choose(observation, positions, door_state)
+        self.presses[choice] += 1
+        self.last_choice = choice
+        return {"choice": choice, "key_action_map": json.dumps(self.key_action_map())}
+
+    def _learn(self, positions, door_state):
+        if self.previous is None or self.last_choice is None:
+            return
+        previous_positions, previous_door = self.previous
+
+        if previous_door != door_state:
+            self.door_buttons["open_door" if door_state == "open" else "close_door"] = (
+                self.last_choice
+            )
+
+        for idx, (x, y) in positions.items():
+            if idx in previous_positions:
+                px, py = previous_positions[idx]
+                self.votes[self.last_choice][idx][(x - px, y - py)] += 1
+
+    def self_agent(self):
+        """
+        Returns the id of the agent that most consistently follows the buttons.
+        """
+        scores = Counter()
+        for agents in self.votes.values():
+            for idx, displacements in agents.items():
+                moved = [
+                    count for move, count in displacements.items() if move != (0, 0)
+                ]
+                scores[idx] += max(moved, default=0) - (
+                    sum(moved) - max(moved, default=0)
+                )
+        return scores.most_common(1)[0][0] if scores else None
+
+    def key_action_map(self):
+        """
+        Returns the current mapping hypothesis (button -> action).
+        """
+        mapping = {button: action for action, button in self.door_buttons.items()}
+        agent = self.self_agent()
+        if agent is None:
+            return mapping
+        for button, agents in self.votes.items():
+            if button in mapping:
+                continue
+            moves = [
+                (count, move) for move, count in agents[agent].items() if move != (0, 0)
+            ]
+            if moves:
+                direction = max(moves)[1]
+                for action, move in MOVES.items():
+                    if move == direction:
+                        mapping[button] = action
+        return mapping
+
+    def _choose(self, observation, positions, door_state):
+        untested = [
+            button for button in BUTTONS if self.presses[button] < self.explore_presses
+        ]
+        if untested:
+            return min(untested, key=lambda button: self.presses[button])
+
+        mapping = self.key_action_map()
+        buttons = {action: button for button, action in mapping.items()}
+        agent = self.self_agent()
+
+        if "open_door" not in buttons or agent not in positions:
+            return self.rng.choice(BUTTONS)
+        if door_state != "open":
+            return buttons["open_door"]
+        if len(positions) > 1:
+            return buttons["open_door"]  # Keep still while the NPCs leave
+
+        # Walk towards the closest door cell
+        x, y = positions[agent]
+        doors = _door_cells(observation.get("current_grid_ascii", []))
+        if not doors:
+            return self.rng.choice(BUTTONS)
+        door_x, door_y = min(
+            doors, key=lambda door: abs(door[0] - x) + abs(door[1] - y)
+        )
+        best = [
+            action
+            for action, (dx, dy) in MOVES.items()
+            if action in buttons
+            and abs(door_x - x - dx) + abs(door_y - y - dy)
+            < abs(door_x - x) + abs(door_y - y)
+        ]
+        return buttons[self.rng.choice(best)] if best else self.rng.choice(BUTTONS)
+
+
+def _door_cells(grid_ascii):
+    """
+    Returns the (x, y) door cells of an ASCII grid (cells may be padded).
+    """
+    if not grid_ascii:
+        return []
+    border = grid_ascii[0]
+    width = len(border) // max(border.count("#") + border.count("D"), 1)
+    return [
+        (x // width, y)
+        for y, row in enumerate(grid_ascii)
+        for x, char in enumerate(row)
+        if char == "D"
+    ]
+
+
+POLICIES = {
+    "random": RandomButtonPolicy,
+    "sequence": FixedSequencePolicy,
+    "oracle": MappingOraclePolicy,
+}
+
+
+class StubLLMApi(LLMApi):
+    """
+    Local drop-in replacement for LLMApi that answers with schema-valid JSON from
+    a scripted policy, so the simulation can run (and be load tested) offline.
+    """
+
+    def __init__(self, policy="random", latency: float = 0.0, **policy_kwargs):
+        """
+        Args:
+            policy (str or Policy): Policy name from POLICIES or a Policy instance.
+            latency (float): Artificial delay, in seconds, added to every request.
+            **policy_kwargs: Arguments used to build the policy from its name.
+        """
+        self._init_defaults()
+        if isinstance(policy, str):
+            self.model = f"stub/{policy}"
+            policy = POLICIES[policy](**policy_kwargs)
+        else:
+            self.model = f"stub/{type(policy).__name__}"
+        self.policy = policy
+        self.decoder = ObservationDecoder()  # Policies read the full encoding
+        self.latency = latency
+        self.request_params = {}
+
+    def generate(self, msg):
+        super().generate(msg)
+        self.turn_msg = msg
+
+    def _reply(self) -> str:
+        observation = (
+            json.loads(self.turn_msg)
+            if isinstance(self.turn_msg, str)
+            else self.turn_msg
+        )
+        observation = self.decoder.decode(observation)
+        reply = {
+            "prev_reasoning": "scripted policy",
+            "key_action_map": "",
+            "next_reasoning": "scripted policy",
+        }
+        reply.update(self.policy.act(observation))
+        reply = json.dumps(reply)
+
+        # Rough token counts, so token accounting can be load tested too
+        prompt_tokens = (len(self.system_message["content"]) + len(self.payload)) // 4
+        completion_tokens = len(reply) // 4
+        self.last_usage = SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+        )
+        return reply
+
+    def _wait_time(self, timeout):
+        """
+        Returns how long a request waits: the artificial latency, capped by the timeout.
+        """
+        timeout = timeout if timeout is not None else self.timeout
+        if timeout is not None and self.latency > timeout:
+            return timeout
+        return self.latency
+
+    def request(self, timeout: float = None) -> str:
+        started = time.perf_counter()
+        wait = self._wait_time(timeout)
+        if wait:
+            with PROFILER.span("llm.http", "llm", model=self.model):
+                time.sleep(wait)
+        if wait < self.latency:
+            error = TimeoutError(f"Stub request timed out after {wait}s")
+            self._record_request(started, error=error)
+            raise error
+        reply = self._reply()
+        self._record_request(started, reply, self.last_usage)
+        return reply
+
+
+class AsyncStubLLMApi(StubLLMApi):
+    """
+    Asyncio variant of StubLLMApi, with the same surface as AsyncLLMApi.
+    """
+
+    async def request(self, timeout: float = None) -> str:
+        started = time.perf_counter()
+        wait = self._wait_time(timeout)
+        if wait:
+            with PROFILER.span("llm.http", "llm", model=self.model):
+                await asyncio.sleep(wait)
+        if wait < self.latency:
+            error = TimeoutError(f"Stub request timed out after {wait}s")
+            self._record_request(started, error=error)
+            raise error
+        reply = self._reply()
+        self._record_request(started, reply, self.last_usage)
+        return reply
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Runs the same seeded episodes with several models at once, on one asyncio
+event loop.
+
+Models are grouped by provider: every provider has one concurrency semaphore
+and a ProviderLimiter (requests and tokens per minute) shared by all its
+models and episodes, so the wall time is bounded by the provider limits
+rather than by running the models one after another. Clients are pooled by
+base_url and api_key, so providers and fallbacks on the same endpoint share
+one connection pool.
+
+The tournament file looks like:
+
+    {
+        "providers": {
+            "openrouter": {
+                "base_url": "https://openrouter.ai/api/v1",
+                "api_key": "YOUR_API_KEY_HERE",
+                "max_concurrency": 16,
+                "requests_per_minute": 60,
+                "tokens_per_minute": 400000
+            }
+        },
+        "models": [
+            {"model": "MODEL_A", "provider": "openrouter"},
+            {"model": "MODEL_B", "provider": "openrouter"}
+        ],
+        "api_retry": {"max_retries": 3}
+    }
+
+`api_retry` and `api_cache` are optional and apply to every model; a model
+entry may add an `api_fallback` model, on the same provider unless it has its
+own `base_url`/`api_key`.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+from collections import Counter
+from datetime import datetime
+from datetime import timezone
+
+# Keep the output clean when pygame is imported
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from openai import AsyncOpenAI  # noqa: E402
+
+from api import AsyncLLMApi  # noqa: E402
+from simulation import Simulation  # noqa: E402
+from utils.metrics import METRICS  # noqa: E402
+from utils.rate_limit import ProviderLimiter  # noqa: E402
+from utils.resilience import RetryPolicy  # noqa: E402
+
+CLIENT_KEYS = ("base_url", "api_key", "timeout")
+
+
+def load_tournament(path):
+    """
+    Reads a tournament file and checks that every model has a known provider.
+    """
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    for entry in config["models"]:
+        if entry.get("provider") not in config["providers"]:
+            raise ValueError(
+                f"Unknown provider for model {entry['model']}: {entry.get('provider')}"
+            )
+    return config
+
+
+def model_config(config, entry):
+    """
+    Builds the configapi.json content of one model of the tournament.
+    """
+    provider = config["providers"][entry["provider"]]
+    api_config = {
+        "api_client": {key: provider[key] for key in CLIENT_KEYS if key in provider},
+        "api_model": {"model": entry["model"]},
+    }
+    for section in ("api_retry", "api_cache"):
+        if section in config:
+            api_config[section] = config[section]
+    if "api_fallback" in entry:
+        api_config["api_fallback"] = entry["api_fallback"]
+    return api_config
+
+
+def _slug(model):
+    return model.replace("/", "_").replace(":", "_")
+
+
+async def _run_tournament(config, episodes, seed, verbose):
+    batch_name = datetime.now(timezone.utc).isoformat().replace(":", "-").split(".")[0]
+
+    # One pooled client per endpoint, one semaphore and limiter per provider
+    clients, semaphores, limiters = {}, {}, {}
+    retry_params = {"max_retries": 0} if "api_retry" in config else {}
+
+    def pooled_client(client_config):
+        key = (client_config["base_url"], client_config["api_key"])
+        if key not in clients:
+            clients[key] = AsyncOpenAI(base_url=key[0], api_key=key[1], **retry_params)
+        return clients[key]
+
+    for name, provider in config["providers"].items():
+        semaphores[name] = asyncio.Semaphore(
+            provider.get("max_concurrency", AsyncLLMApi.DEFAULT_MAX_CONCURRENCY)
+        )
+        limiters[name] = ProviderLimiter(
+            name, provider.get("requests_per_minute"), provider.get("tokens_per_minute")
+        )
+
+    runs = []  # (model, episode, simulation)
+    for entry in config["models"]:
+        provider = entry["provider"]
+        api_config = model_config(config, entry)
+        client = pooled_client(api_config["api_client"])
+        fallback_client = pooled_client(
+            {**api_config["api_client"], **api_config.get("api_fallback", {})}
+        )
+        # Shared by the episodes of the model, so hedging sees all its latencies
+        retry = RetryPolicy(**config["api_retry"]) if "api_retry" in config else None
+        for episode in range(episodes):
+            api = AsyncLLMApi(
+                config=api_config,
+                client=client,
+                semaphore=semaphores[provider],
+                retry=retry,
+                fallback_client=fallback_client,
+                limiter=limiters[provider],
+            )
+            simul = Simulation(
+                headless=True,
+                api=api,
+                log_name=f"{batch_name}_{_slug(entry['model'])}_ep{episode:04d}.jsonl",
+                verbose=verbose,
+                seed=seed + episode,
+            )
+            runs.append((entry["model"], episode, simul))
+
+    try:
+        results = await asyncio.gather(
+            *(simul.run_episode_async() for _, _, simul in runs)
+        )
+    finally:
+        for _, _, simul in runs:
+            simul.api.close()
+        for client in clients.values():
+            await client.close()
+
+    by_model = {entry["model"]: [None] * episodes for entry in config["models"]}
+    for (model, episode, _), result in zip(runs, results):
+        by_model[model][episode] = result
+    return by_model
+
+
+def run_tournament(config, episodes=1, seed=None, verbose=False):
+    """
+    Runs every model of the tournament on the same seeded episodes, concurrently.
+
+    Args:
+        config (dict): Tournament configuration (see load_tournament).
+        episodes (int): Number of episodes per model.
+        seed (int): Base seed; episode i uses seed + i for every model. A random
+            base seed is drawn if not given.
+        verbose (bool): If True, prints the simulation output.
+
+    Returns:
+        dict: model -> list of EpisodeResult, ordered by episode index.
+    """
+    if seed is None:
+        seed = random.randrange(2**31)
+    return asyncio.run(_run_tournament(config, episodes, seed, verbose))
+
+
+def summarize(results):
+    """
+    Returns per-model statistics: outcome counts, success rate, mean turns and tokens.
+    """
+    summary = {}
+    for model, model_results in results.items():
+        outcomes = Counter(result.outcome for result in model_results)
+        summary[model] = {
+            "episodes": len(model_results),
+            "outcomes": dict(outcomes),
+            "success_rate": (
+                outcomes["success"] / len(model_results) if model_results else 0.0
+            ),
+            "mean_turns": (
+                statistics.fmean(result.turns for result in model_results)
+                if model_results
+                else 0.0
+            ),
+            "total_tokens": sum(
+                result.tokens["total_tokens"] for result in model_results
+            ),
+            "seeds": [result.seed for result in model_results],
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run the same seeded episodes with several models."
+    )
+    parser.add_argument("config", help="tournament JSON file")
+    parser.add_argument(
+        "-n", "--episodes", type=int, default=1, help="episodes per model"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=None, help="base seed (episode i uses seed + i)"
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="print simulation output"
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        default=None,
+        help="write the per-model summary to this JSON file",
+    )
+    parser.add_argument(
+        "--metrics",
+        default=None,
+        help="write the request metrics to this file (.json or Prometheus text)",
+    )
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    results = run_tournament(
+        load_tournament(args.config), args.episodes, args.seed, args.verbose
+    )
+    elapsed = time.perf_counter() - started
+
+    summary = summarize(results)
+    for model, stats in summary.items():
+        print(
+            f"{model}: success {stats['success_rate']:.0%}, "
+            f"mean turns {stats['mean_turns']:.1f}, "
+            f"tokens {stats['total_tokens']}, outcomes {stats['outcomes']}"
+        )
+    print(f"wall time: {elapsed:.1f}s")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"wall_seconds": elapsed, "models": summary}, f, indent=2)
+    if args.metrics:
+        METRICS.write(args.metrics)
+
+
+if __name__ == "__main__":
+    main()
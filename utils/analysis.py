@@ -0,0 +1,283 @@
+import glob
+import json
+import os
+import re
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.batch_env import ACTIONS
+from utils.batch_env import BUTTONS
+from utils.log_reader import EpisodeLog
+
+DEFAULT_CACHE_PATH = "cache/analysis_cache.json"
+STREAK_WARNING = (
+    5  # The prompt warns the LLM about pressing a button this many times in a row
+)
+
+# "btn3": "move_up", btn3 -> move_up, btn3 = move_up, ...
+_MAPPING_PATTERN = re.compile(r"(btn[1-6])\W{0,6}(" + "|".join(ACTIONS) + ")")
+
+
+def parse_key_action_map(key_action_map):
+    """
+    Extracts the button -> action pairs stated in a key_action_map field, which
+    the LLM may send as an object, as a JSON string or as free text.
+
+    Returns:
+        dict: button -> action, only for the recognized pairs.
+    """
+    if isinstance(key_action_map, str):
+        try:
+            key_action_map = json.loads(key_action_map)
+        except ValueError:
+            return dict(_MAPPING_PATTERN.findall(key_action_map))
+    if isinstance(key_action_map, dict):
+        return {
+            button: action
+            for button, action in key_action_map.items()
+            if button in BUTTONS and action in ACTIONS
+        }
+    return {}
+
+
+def analyze_log(path):
+    """
+    Computes the metrics of one episode log.
+
+    Args:
+        path (str): Path of a delta encoded episode log.
+
+    Returns:
+        dict: Episode metrics, or None if the file is not an episode log.
+    """
+    log = EpisodeLog(path)
+    try:
+        header = log.header
+    except (ValueError, StopIteration, KeyError):
+        return None
+
+    button_map = header["button_map"]
+    mapped_on = {}  # button -> first turn its mapping was stated correctly
+    turns = format_errors = choice_errors = 0
+    streak = longest_streak = long_streaks = 0
+    previous = None
+    end = {}
+
+    for record in log.records():
+        if record["type"] == "end":
+            end = record
+            continue
+        turns += 1
+
+        if record["type"] == "error":
+            if record["error"] == "format error":
+                format_errors += 1
+            else:
+                choice_errors += 1
+            continue
+
+        choice = record["choice"]
+        streak = streak + 1 if choice == previous else 1
+        previous = choice
+        longest_streak = max(longest_streak, streak)
+        if streak == STREAK_WARNING:
+            long_streaks += 1
+
+        stated = parse_key_action_map(record["llm"].get("key_action_map"))
+        for button, action in stated.items():
+            if button not in mapped_on and button_map[button] == action:
+                mapped_on[button] = record["turn"]
+
+    tokens = end.get("tokens") or {}
+    return {
+        "model": header.get("model"),
+        "outcome": end.get("outcome"),
+        "turns": turns,
+        "format_errors": format_errors,
+        "choice_errors": choice_errors,
+        "longest_streak": longest_streak,
+        "long_streaks": long_streaks,
+        "mapped_on": {button: mapped_on.get(button) for button in BUTTONS},
+        "mapped_on_by_action": {
+            button_map[button]: turn for button, turn in mapped_on.items()
+        },
+        "prompt_tokens": tokens.get("prompt_tokens", 0),
+        "completion_tokens": tokens.get("completion_tokens", 0),
+    }
+
+
+def _load_cache(cache_path):
+    if cache_path and os.path.isfile(cache_path):
+        with open(cache_path, encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def _save_cache(cache_path, cache):
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, separators=(",", ":"))
+    os.replace(tmp_path, cache_path)
+
+
+def analyze_logs(paths, workers=None, cache_path=DEFAULT_CACHE_PATH):
+    """
+    Computes the metrics of many logs in a process pool. Metrics are cached per
+    file with its modification time and size, so only new or changed logs are
+    read again.
+
+    Args:
+        paths (list of str): Episode logs.
+        workers (int): Number of worker processes. Defaults to the number of CPUs.
+            With workers=1 the logs are read in the current process.
+        cache_path (str): JSON file of the cache. None disables the cache.
+
+    Returns:
+        list of dict: Metrics of each episode log (files that aren't logs are skipped).
+    """
+    cache = _load_cache(cache_path)
+    stats, stale = {}, []
+    for path in paths:
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        entry = cache.get(key)
+        if (
+            entry
+            and entry["mtime"] == stat.st_mtime_ns
+            and entry["size"] == stat.st_size
+        ):
+            stats[path] = entry["stats"]
+        else:
+            stale.append((path, key, stat))
+
+    if stale:
+        stale_paths = [path for path, _, _ in stale]
+        if workers == 1 or len(stale_paths) == 1:
+            results = [analyze_log(path) for path in stale_paths]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                chunksize = max(
+                    len(stale_paths) // (4 * (workers or os.cpu_count() or 1)), 1
+                )
+                results = list(pool.map(analyze_log, stale_paths, chunksize=chunksize))
+
+        for (path, key, stat), result in zip(stale, results):
+            stats[path] = result
+            cache[key] = {
+                "mtime": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "stats": result,
+            }
+
+        if cache_path:
+            _save_cache(cache_path, cache)
+
+    return [stats[path] for path in paths if stats[path] is not None]
+
+
+def aggregate(stats):
+    """
+    Aggregates episode metrics per model.
+
+    Args:
+        stats (list of dict): Episode metrics from analyze_logs.
+
+    Returns:
+        dict: model -> aggregates (outcome rates, mean turns until each action's
+        button is mapped correctly and the fraction of episodes where it was,
+        streaks, format error rate and token totals).
+    """
+    by_model = defaultdict(list)
+    for episode in stats:
+        by_model[episode["model"]].append(episode)
+
+    report = {}
+    for model, episodes in sorted(by_model.items(), key=lambda item: str(item[0])):
+        count = len(episodes)
+        turns = sum(episode["turns"] for episode in episodes)
+        outcomes = defaultdict(int)
+        for episode in episodes:
+            outcomes[episode["outcome"]] += 1
+
+        mapping = {}
+        for action in ACTIONS:
+            mapped = [
+                episode["mapped_on_by_action"][action]
+                for episode in episodes
+                if action in episode["mapped_on_by_action"]
+            ]
+            mapping[action] = {
+                "mapped_rate": len(mapped) / count,
+                "mean_turns_to_map": sum(mapped) / len(mapped) if mapped else None,
+            }
+
+        report[model] = {
+            "episodes": count,
+            "outcome_rates": {
+                str(outcome): n / count for outcome, n in outcomes.items()
+            },
+            "mean_turns": turns / count,
+            "mapping": mapping,
+            "mean_longest_streak": sum(
+                episode["longest_streak"] for episode in episodes
+            )
+            / count,
+            "long_streaks": sum(episode["long_streaks"] for episode in episodes),
+            "format_error_rate": (
+                sum(episode["format_errors"] for episode in episodes) / turns
+                if turns
+                else 0.0
+            ),
+            "choice_error_rate": (
+                sum(episode["choice_errors"] for episode in episodes) / turns
+                if turns
+                else 0.0
+            ),
+            "prompt_tokens": sum(episode["prompt_tokens"] for episode in episodes),
+            "completion_tokens": sum(
+                episode["completion_tokens"] for episode in episodes
+            ),
+        }
+    return report
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Compute per-model metrics over episode logs."
+    )
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        default=["logs"],
+        help="log files or folders (default: logs)",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=None,
+        help="worker processes (default: CPUs)",
+    )
+    parser.add_argument(
+        "--cache", default=DEFAULT_CACHE_PATH, help="metrics cache file"
+    )
+    parser.add_argument("--no-cache", action="store_true", help="read every log again")
+    args = parser.parse_args()
+
+    paths = []
+    for path in args.paths:
+        paths.extend(
+            sorted(glob.glob(os.path.join(path, "*.jsonl")))
+            if os.path.isdir(path)
+            else [path]
+        )
+
+    stats = analyze_logs(paths, args.workers, None if args.no_cache else args.cache)
+    print(json.dumps(aggregate(stats), indent=2))
+
+
+if __name__ == "__main__":
+    main()
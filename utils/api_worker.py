@@ -0,0 +1,103 @@
+import queue
+import threading
+from collections import namedtuple
+from concurrent.futures import Future
+
+# Result of one request, delivered through ApiWorker.results
+ApiResult = namedtuple("ApiResult", ["request_id", "reply", "usage", "error"])
+
+
+class ApiWorker:
+    """
+    Single long-lived thread that makes the LLM requests of a simulation.
+
+    Requests are submitted with an id and return a Future. Every finished
+    request is also put on the thread-safe `results` queue, tagged with its id,
+    so the caller can tell stale results apart from the one it is waiting for.
+    """
+
+    def __init__(self, api, on_result=None):
+        """
+        Args:
+            api (LLMApi): Backend used for the requests.
+            on_result (callable): Called from the worker thread after a result is
+                queued (e.g. to wake up the Pygame loop).
+        """
+        self.api = api
+        self.on_result = on_result
+        self.results = queue.Queue()
+        self._requests = queue.Queue()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="api-worker", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, request_id, data, timeout=None):
+        """
+        Queues a request.
+
+        Args:
+            request_id (int): Id returned with the result.
+            data (str): Turn JSON sent to the LLM.
+            timeout (float): Per-request timeout in seconds (None: api default).
+
+        Returns:
+            Future: Resolved with the reply, or with the raised exception.
+        """
+        if self._closed.is_set():
+            raise RuntimeError("ApiWorker is shut down")
+        future = Future()
+        self._requests.put((request_id, data, timeout, future))
+        return future
+
+    def _run(self):
+        while True:
+            item = self._requests.get()
+            if item is None or self._closed.is_set():
+                break
+
+            request_id, data, timeout, future = item
+            if not future.set_running_or_notify_cancel():
+                continue  # Cancelled before it started
+
+            try:
+                self.api.generate(msg=data)
+                reply = self.api.request(timeout=timeout)
+                result = ApiResult(request_id, reply, self.api.last_usage, None)
+                future.set_result(reply)
+            except Exception as e:
+                result = ApiResult(request_id, None, None, e)
+                future.set_exception(e)
+
+            # Results of calls that finish after shutdown are dropped
+            if self._closed.is_set():
+                break
+            self.results.put(result)
+            if self.on_result is not None:
+                self.on_result()
+
+    def cancel_pending(self):
+        """
+        Cancels every request that has not started yet.
+        """
+        while True:
+            try:
+                item = self._requests.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None:
+                item[3].cancel()
+
+    def shutdown(self, timeout=1.0):
+        """
+        Stops the worker without waiting for an in-flight call to finish: pending
+        requests are cancelled, and the result of the running one is dropped.
+
+        Args:
+            timeout (float): Maximum time to wait for the thread, in seconds.
+        """
+        self._closed.set()
+        self.cancel_pending()
+        self._requests.put(None)
+        self._thread.join(timeout)
@@ -0,0 +1,278 @@
+import numpy as np
+from utils.grid_codes import AGENT_OFFSET
+from utils.grid_codes import DOOR
+from utils.grid_codes import EMPTY
+from utils.grid_codes import grid_dtype
+from utils.grid_codes import WALL
+
+# Same action order and buttons as the Simulation class
+ACTIONS = ("move_left", "move_right", "move_up", "move_down", "open_door", "close_door")
+BUTTONS = ("btn1", "btn2", "btn3", "btn4", "btn5", "btn6")
+
+# Position offsets (dy, dx) for the move actions, indexed like ACTIONS
+ACTION_MOVES = np.array([(0, -1), (0, 1), (-1, 0), (1, 0)], dtype=np.int32)
+OPEN_DOOR = ACTIONS.index("open_door")
+CLOSE_DOOR = ACTIONS.index("close_door")
+
+# NPC random directions: Up, Down, Left, Right (same as NPC.get_random_move)
+NPC_MOVES = np.array([(-1, 0), (1, 0), (0, -1), (0, 1)], dtype=np.int32)
+
+# Episode outcome codes
+RUNNING, SUCCESS, FAILURE, TIMEOUT = 0, 1, 2, 3
+OUTCOMES = (None, "success", "failure", "timeout")
+
+
+class BatchSimulation:
+    """
+    Vectorized engine that advances B independent episodes at once.
+
+    The state of all episodes is kept in stacked NumPy arrays:
+        grid (B, H, W): cell codes (see utils.grid_codes).
+        positions (B, N, 2): (y, x) position of every agent.
+        alive (B, N): False once an agent has exited through the door.
+        door_open (B,): current door state.
+        key_maps (B, 6): action index (into ACTIONS) for each button.
+        player (B,): index of the LLM/policy-controlled agent.
+        outcome (B,): RUNNING, SUCCESS, FAILURE or TIMEOUT.
+
+    Movement and door rules match Simulation: agents only move into empty
+    cells, agents reaching the open door leave the grid, and NPCs see the
+    door state of their previous step (Character.door_state is only refreshed
+    in move()). NPCs of one episode behave as if processed in index order, so a
+    cell freed by a lower index NPC can be taken by a higher index one in the
+    same step; all NPCs of all episodes are advanced in one vectorized pass.
+    """
+
+    def __init__(
+        self,
+        batch_size,
+        y_grid_max,
+        x_grid_max,
+        characters_num,
+        door_size=3,
+        max_turns=None,
+        seed=None,
+    ):
+        """
+        Initializes the engine and resets all episodes.
+
+        Args:
+            batch_size (int): Number of episodes (B).
+            y_grid_max (int): Number of rows in the grid, borders included.
+            x_grid_max (int): Number of columns in the grid, borders included.
+            characters_num (int): Number of agents per episode (N).
+            door_size (int): Door size, as in _generate_grid.
+            max_turns (int): Turn limit before an episode ends in a timeout.
+            seed (int): Seed of the random generator.
+        """
+        self.batch_size = batch_size
+        self.y_grid_max = y_grid_max
+        self.x_grid_max = x_grid_max
+        self.characters_num = characters_num
+        self.door_size = door_size
+        self.max_turns = max_turns
+        self.rng = np.random.default_rng(seed)
+        self.reset()
+
+    def reset(self):
+        """
+        Starts B new episodes: grids, agent positions, doors, key maps and players.
+        """
+        B, H, W, N = (
+            self.batch_size,
+            self.y_grid_max,
+            self.x_grid_max,
+            self.characters_num,
+        )
+        batch = np.arange(B)
+
+        self.grid = np.full((B, H, W), EMPTY, dtype=grid_dtype(N))
+        self.grid[:, 0, :] = WALL
+        self.grid[:, -1, :] = WALL
+        self.grid[:, :, 0] = WALL
+        self.grid[:, :, -1] = WALL
+        self._place_doors()
+
+        # Distinct random interior cells for every agent of every episode
+        interior = (H - 2) * (W - 2)
+        cells = self.rng.random((B, interior)).argsort(axis=1)[:, :N]
+        self.positions = np.stack(
+            [cells // (W - 2) + 1, cells % (W - 2) + 1], axis=-1
+        ).astype(np.int32)
+        self.grid[batch[:, None], self.positions[..., 0], self.positions[..., 1]] = (
+            AGENT_OFFSET + np.arange(N)
+        )
+
+        self.alive = np.ones((B, N), dtype=bool)
+        self.door_open = np.zeros(B, dtype=bool)
+        self.npc_door_open = np.zeros(B, dtype=bool)  # Door state seen by the NPCs
+        self.key_maps = (
+            self.rng.random((B, len(ACTIONS))).argsort(axis=1).astype(np.int8)
+        )
+        self.player = self.rng.integers(0, N, size=B)
+        self.outcome = np.full(B, RUNNING, dtype=np.int8)
+        self.turn = np.ones(B, dtype=np.int32)
+
+    def _place_doors(self):
+        """
+        Places one door per episode on a random border, like _generate_grid.
+        """
+        B, H, W = self.batch_size, self.y_grid_max, self.x_grid_max
+        door_wall = self.rng.integers(0, 4, size=B)  # 0=North, 1=East, 2=South, 3=West
+        horizontal = (door_wall == 0) | (door_wall == 2)
+        wall_len = np.where(horizontal, W, H)
+        center = self.rng.integers(1, wall_len - 1)
+
+        door_size_mid = (self.door_size - 1) // 2
+        d1 = np.maximum(center - door_size_mid + 1, 0)[:, None, None]
+        d2 = np.minimum(center + door_size_mid + 1, wall_len - 1)[:, None, None]
+
+        rows = np.arange(H)[None, :, None]
+        cols = np.arange(W)[None, None, :]
+        in_cols = (cols >= d1) & (cols < d2)
+        in_rows = (rows >= d1) & (rows < d2)
+        wall = door_wall[:, None, None]
+
+        door = (
+            ((wall == 0) & (rows == 0) & in_cols)
+            | ((wall == 2) & (rows == H - 1) & in_cols)
+            | ((wall == 1) & (cols == W - 1) & in_rows)
+            | ((wall == 3) & (cols == 0) & in_rows)
+        )
+        self.grid[door] = DOOR
+
+    @property
+    def running(self):
+        """
+        Boolean mask (B,) of the episodes that have not ended.
+        """
+        return self.outcome == RUNNING
+
+    def step(self, buttons):
+        """
+        Advances every running episode by one turn: player action, then NPCs.
+
+        Args:
+            buttons (array-like): Button index (0-5) pressed in each episode.
+        """
+        running = self.running
+        self.turn[running] += 1
+
+        self.step_player(buttons)
+        self.step_npcs()
+
+        if self.max_turns is not None:
+            self.outcome[self.running & (self.turn > self.max_turns)] = TIMEOUT
+
+    def step_player(self, buttons):
+        """
+        Applies the pressed button to the controlled agent of each running episode.
+
+        Args:
+            buttons (array-like): Button index (0-5) pressed in each episode.
+        """
+        b = np.flatnonzero(self.running)
+        action = self.key_maps[b, np.asarray(buttons)[b]]
+
+        self.door_open[b[action == OPEN_DOOR]] = True
+        self.door_open[b[action == CLOSE_DOOR]] = False
+
+        moving = action < len(ACTION_MOVES)
+        b, action = b[moving], action[moving]
+        player = self.player[b]
+        pos = self.positions[b, player]
+        target = pos + ACTION_MOVES[action]
+        cell = self.grid[b, target[:, 0], target[:, 1]]
+
+        exits = (cell == DOOR) & self.door_open[b]
+        moves = (cell == EMPTY) | exits
+
+        self.grid[b[moves], pos[moves, 0], pos[moves, 1]] = EMPTY
+        self.grid[b[moves], target[moves, 0], target[moves, 1]] = (
+            AGENT_OFFSET + player[moves]
+        )
+        self.positions[b[moves], player[moves]] = target[moves]
+
+        # The player wins only if every NPC has already left
+        b = b[exits]
+        others_alive = self.alive[b].sum(axis=1) > 1
+        self.outcome[b] = np.where(others_alive, FAILURE, SUCCESS)
+
+    def step_npcs(self):
+        """
+        Moves every alive NPC of every running episode in a random direction.
+        NPCs reaching the open door leave the grid.
+
+        All NPCs of all episodes are stepped at once, with the result of moving
+        them one by one in index order: a target cell is taken by the lowest
+        index NPC heading there, and an occupied one only if its occupant (a
+        lower index NPC) leaves it in this step.
+        """
+        B, H, W, N = (
+            self.batch_size,
+            self.y_grid_max,
+            self.x_grid_max,
+            self.characters_num,
+        )
+        running = self.running
+        directions = self.rng.integers(0, len(NPC_MOVES), size=(B, N))
+        door_open = self.door_open & self.npc_door_open
+
+        # Active NPCs, ordered by episode then index; cells are flat indices into the
+        # grid
+        b, k = np.nonzero(
+            running[:, None] & self.alive & (np.arange(N) != self.player[:, None])
+        )
+        agent = b * N + k
+        pos = self.positions.reshape(-1, 2)[agent]
+        target = pos + NPC_MOVES[directions.ravel()[agent]]
+        grid = self.grid.reshape(-1)
+        origin_cell = (b * H + pos[:, 0]) * W + pos[:, 1]
+        target_cell = (b * H + target[:, 0]) * W + target[:, 1]
+        cell = grid[target_cell].astype(np.int64)
+
+        exits = (cell == DOOR) & door_open[b]
+        empty = cell == EMPTY
+        occupant = cell - AGENT_OFFSET  # Agent in the target cell, if >= 0
+        # A cell held by a higher index NPC or by the player stays taken
+        vacated = (occupant >= 0) & (occupant < k) & (occupant != self.player[b])
+
+        # Only the first (lowest index) contender of a cell can take it: sort
+        # (cell, position in the list) keys and keep the first of every cell
+        count = len(b)
+        contender = np.flatnonzero(empty | vacated)
+        keys = np.sort(target_cell[contender] * count + contender)
+        cells = keys // count
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = cells[1:] != cells[:-1]
+        taker = np.zeros(count, dtype=bool)
+        taker[keys[first] % count] = True
+
+        # Takers of an empty cell move; takers of an occupied one move if its
+        # occupant left, which is resolved along the chains of lower indices
+        success = exits | (taker & empty)
+        pending = np.flatnonzero(taker & vacated)
+        slot = np.full(B * N, -1)
+        slot[agent] = np.arange(count)
+        occupant_slot = slot[b[pending] * N + occupant[pending]]
+        unresolved = np.zeros(count, dtype=bool)
+        unresolved[pending] = True
+        while pending.size:
+            done = ~unresolved[occupant_slot]
+            success[pending[done]] = success[occupant_slot[done]]
+            unresolved[pending[done]] = False
+            pending, occupant_slot = pending[~done], occupant_slot[~done]
+
+        moves = success & ~exits
+        grid[origin_cell[success]] = EMPTY
+        grid[target_cell[moves]] = AGENT_OFFSET + k[moves]
+        self.positions.reshape(-1, 2)[agent[moves]] = target[moves]
+        self.alive.reshape(-1)[agent[exits]] = False
+
+        self.npc_door_open[running] = self.door_open[running]
+
+    def outcomes(self):
+        """
+        Returns the outcome of each episode as a string (None while running).
+        """
+        return [OUTCOMES[code] for code in self.outcome]
@@ -20,8 +20,9 @@ class mainConfig:
                 "y_grid_max": 32,
                 "square_tam": 10,
                 "space_tam": 2,
+                "fps": 60,
             },
-            "game": {"characters_num": 4},
+            "game": {"characters_num": 4, "door_size": 5, "max_turns": 100},
         }
 
     def read_config(self):
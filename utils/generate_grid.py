@@ -1,9 +1,14 @@
 import random
 
 import numpy as np
+from utils.grid_codes import AGENT_OFFSET
+from utils.grid_codes import DOOR
+from utils.grid_codes import EMPTY
+from utils.grid_codes import grid_dtype
+from utils.grid_codes import WALL
 
 
-def _generate_grid(y_grid_max, x_grid_max, characters_num, door_size=3):
+def _generate_grid(y_grid_max, x_grid_max, characters_num, door_size=3, rng=random):
     """
     Generates a 2D grid with borders, randomly placed characters, and a door on a random border.
 
@@ -11,37 +16,40 @@ def _generate_grid(y_grid_max, x_grid_max, characters_num, door_size=3):
         y_grid_max (int): Number of rows in the grid.
         x_grid_max (int): Number of columns in the grid.
         characters_num (int): Number of characters to place inside the grid.
+        door_size (int): Door size.
+        rng (random.Random): Random stream to use. Defaults to the global one.
 
     Returns:
         tuple:
-            - mainGrid (np.ndarray): The generated grid as a 2D numpy array of strings.
-            - positions (list of tuple): List of (x, y) positions where characters were placed.
+            - mainGrid (np.ndarray): The generated grid as a 2D numpy array of
+              cell codes (see utils.grid_codes), wide enough for the agent count.
+            - positions (list of tuple): List of (y, x) positions where characters
+              were placed.
     """
-    # Initialize the grid filled with '.'
-    mainGrid = np.full((y_grid_max, x_grid_max), ".", dtype=str)
-
-    # Add borders to the grid (set border cells to '#')
-    mainGrid[0, :] = "#"
-    mainGrid[-1, :] = "#"
-    mainGrid[:, 0] = "#"
-    mainGrid[:, -1] = "#"
+    # Initialize the grid with empty cells
+    mainGrid = np.full(
+        (y_grid_max, x_grid_max), EMPTY, dtype=grid_dtype(characters_num)
+    )
 
-    # Add characters to the grid at random positions (not on the border)
-    positions = set()
-    while len(positions) < characters_num:
-        x = random.randint(1, x_grid_max - 2)  # Avoid border columns
-        y = random.randint(1, y_grid_max - 2)  # Avoid border rows
-        positions.add((x, y))
+    # Add borders to the grid
+    mainGrid[0, :] = WALL
+    mainGrid[-1, :] = WALL
+    mainGrid[:, 0] = WALL
+    mainGrid[:, -1] = WALL
 
-    positions = list(positions)
+    # Add characters to the grid at distinct random interior cells (not on the border)
+    columns = x_grid_max - 2
+    cells = rng.sample(range((y_grid_max - 2) * columns), characters_num)
+    positions = [(cell // columns + 1, cell % columns + 1) for cell in cells]
 
     # Place each character in the grid, using its index as the label
-    for idx, (x, y) in enumerate(positions, start=0):
-        mainGrid[x, y] = str(idx)
+    if positions:
+        rows, cols = np.array(positions).T
+        mainGrid[rows, cols] = AGENT_OFFSET + np.arange(characters_num)
 
-    # Add a door ('D') on a random border
+    # Add a door on a random border
     # door_wall: 0=North, 1=East, 2=South, 3=West
-    door_wall = random.choice([0, 1, 2, 3])
+    door_wall = rng.choice([0, 1, 2, 3])
     wall_range = (
         range(1, x_grid_max - 1) if door_wall in [0, 2] else range(1, y_grid_max - 1)
     )
@@ -49,21 +57,21 @@ def _generate_grid(y_grid_max, x_grid_max, characters_num, door_size=3):
     door_size_mid = (door_size - 1) // 2
 
     if door_wall in [0, 2]:  # Norte ou Sul
-        door_x = random.choice(wall_range)
+        door_x = rng.choice(wall_range)
         door_y = 0 if door_wall == 0 else y_grid_max - 1
         d1, d2 = door_x - door_size_mid, door_x + door_size_mid + 1
 
-        d1 = max(d1+1, 0)
-        d2 = min(d2, x_grid_max-1)
-        mainGrid[door_y, d1:d2] = "D"
+        d1 = max(d1 + 1, 0)
+        d2 = min(d2, x_grid_max - 1)
+        mainGrid[door_y, d1:d2] = DOOR
 
     elif door_wall in [1, 3]:  # Leste ou Oeste
         door_x = x_grid_max - 1 if door_wall == 1 else 0
-        door_y = random.choice(wall_range)
+        door_y = rng.choice(wall_range)
         d1, d2 = door_y - door_size_mid, door_y + door_size_mid + 1
-        
-        d1 = max(d1+1, 0)
-        d2 = min(d2, x_grid_max-1)
-        mainGrid[d1:d2, door_x] = "D"
+
+        d1 = max(d1 + 1, 0)
+        d2 = min(d2, x_grid_max - 1)
+        mainGrid[d1:d2, door_x] = DOOR
 
     return mainGrid, positions
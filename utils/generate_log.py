@@ -1,39 +1,181 @@
+import atexit
+import gzip
 import json
 import os
-from datetime import datetime, timezone
+import queue
+import shutil
+import threading
+from datetime import datetime
+from datetime import timezone
+
 
 class JsonLogger:
-    def __init__(self, config_path = 'configapi.json', folder_path='logs'):
+    """
+    Writes the episode log as compact JSONL (one record per line).
+
+    The log is delta encoded: a "header" record holds what is fixed for the
+    episode (seed, button map, controlled agent, grid and initial positions),
+    then every turn only records the reply and what changed. Full per-turn
+    views are rebuilt by utils.log_reader.
+
+    Records are queued and written by a background thread that keeps the file
+    open, so logging stays off the simulation critical path. The queue is
+    bounded: when the writer falls behind, log() waits for free space.
+    """
+
+    def __init__(
+        self,
+        config_path="configapi.json",
+        folder_path="logs",
+        file_name=None,
+        model_name=None,
+        queue_size=1024,
+        flush_every=1,
+        fsync=False,
+        max_bytes=None,
+    ):
+        """
+        Args:
+            config_path (str): API config file, read for the model name if not given.
+            folder_path (str): Folder of the log files.
+            file_name (str): Log file name. Defaults to the current timestamp.
+            model_name (str): Model name written in the log header.
+            queue_size (int): Maximum number of records waiting to be written.
+            flush_every (int): Flush after this many records (and whenever the queue is
+                empty).
+            fsync (bool): If True, fsync the file on every flush.
+            max_bytes (int): Rotate the file once it exceeds this size, compressing
+                the old part with gzip (<log>.1.gz, <log>.2.gz, ...; EpisodeLog
+                reads them back before the live file). None means no rotation.
+        """
         os.makedirs(folder_path, exist_ok=True)
-        timestamp = datetime.now(timezone.utc).isoformat().replace(":", "-").split(".")[0]
-        with open(config_path, 'r') as f:
-            config_path = json.load(f)
-        self.model_name = config_path['api_model']['model'].replace("/", "_").replace(":", "_")
-        self.log_path = os.path.join(folder_path, f"{timestamp}.jsonl")
-
-    def log_main_data(self, LLM_control, button_map):
-        log_entry = {
-            "model": self.model_name,
-            "LLM_control": LLM_control,
-            "button_map": button_map
-        }
-        with open(self.log_path, 'a', encoding='utf-8') as f:
-            f.write(json.dumps(log_entry, ensure_ascii=False, indent=4) + '\n\n')
-
-    def log(self, input_json, output_json):
-        
-        log_entry = {
-            "user_data": json.loads(input_json),
-            "llm_data": json.loads(output_json)
-
-        }
-        with open(self.log_path, 'a', encoding='utf-8') as f:
-            f.write(json.dumps(log_entry, ensure_ascii=False, indent=4) + '\n\n')
+        timestamp = (
+            datetime.now(timezone.utc).isoformat().replace(":", "-").split(".")[0]
+        )
+        if model_name is None:
+            with open(config_path) as f:
+                model_name = json.load(f)["api_model"]["model"]
+        self.model_name = model_name.replace("/", "_").replace(":", "_")
+        if file_name is None:
+            file_name = f"{timestamp}.jsonl"
+        self.log_path = os.path.join(folder_path, file_name)
+
+        self.flush_every = flush_every
+        self.fsync = fsync
+        self.max_bytes = max_bytes
+        self.rotations = 0
+
+        self._file = open(self.log_path, "a", encoding="utf-8")
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(
+            target=self._writer, name="json-logger", daemon=True
+        )
+        self._thread.start()
+        self._closed = False
+        atexit.register(self.close)
+
+    def log_header(self, LLM_control, button_map, **episode):
+        """
+        Queues the episode header.
+
+        Args:
+            LLM_control (int): Index of the agent controlled by the LLM.
+            button_map (dict): Button -> action mapping of the episode.
+            **episode: Other fixed data of the episode (seed, config, grid...).
+        """
+        self.log(
+            "header",
+            model=self.model_name,
+            LLM_control=LLM_control,
+            button_map=button_map,
+            **episode,
+        )
+
+    def log(self, record_type, **fields):
+        """
+        Queues a record. It is serialized by the writer thread, so the fields must
+        not be modified afterwards.
+
+        Args:
+            record_type (str): "header", "turn", "error" or "end".
+            **fields: Content of the record.
+        """
+        if self._closed:
+            return
+        self._queue.put({"type": record_type, **fields})
+
+    def _encode(self, record):
+        return json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+
+    def _writer(self):
+        unflushed = 0
+        while True:
+            record = self._queue.get()
+            if record is None:
+                break
+
+            self._file.write(self._encode(record) + "\n")
+            unflushed += 1
+
+            if unflushed >= self.flush_every or self._queue.empty():
+                self._flush()
+                unflushed = 0
+                if self.max_bytes is not None and self._file.tell() >= self.max_bytes:
+                    self._rotate()
+
+        self._flush()
+        self._file.close()
+
+    def _flush(self):
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def _rotate(self):
+        """
+        Compresses the current file to <log>.<n>.gz and starts a new one.
+        """
+        self._file.close()
+        self.rotations += 1
+        with open(self.log_path, "rb") as src, gzip.open(
+            f"{self.log_path}.{self.rotations}.gz", "wb"
+        ) as dst:
+            shutil.copyfileobj(src, dst)
+        self._file = open(self.log_path, "w", encoding="utf-8")
+
+    def close(self):
+        """
+        Writes the queued records and closes the file.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        atexit.unregister(self.close)
+
+
+class NullLogger:
+    """
+    Logger that writes nothing, used when logging is disabled (e.g. replays).
+    """
+
+    log_path = None
+
+    def log_header(self, LLM_control, button_map, **episode):
+        pass
+
+    def log(self, record_type, **fields):
+        pass
+
+    def close(self):
+        pass
+
 
 if __name__ == "__main__":
     logger = JsonLogger()
 
-    logger.log({"cmd": "start"}, {"status": "ok"})
-    logger.log({"cmd": "step1"}, {"status": "executado"})
-    logger.log({"cmd": "end"}, {"status": "finalizado"})
-
+    logger.log_header(0, {"btn1": "move_left"}, seed=1)
+    logger.log("turn", turn=1, choice="btn1", moved=[[0, 1, 2]])
+    logger.log("end", outcome="timeout", turns=1)
+    logger.close()
@@ -0,0 +1,67 @@
+"""
+Integer cell codes used for the grid.
+
+Agents are stored as AGENT_OFFSET + agent index, so any cell code greater or
+equal to AGENT_OFFSET holds an agent.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+EMPTY = 0
+WALL = 1
+DOOR = 2
+AGENT_OFFSET = 3
+
+
+def agent_code(idx):
+    """
+    Returns the cell code for the agent with the given index.
+    """
+    return AGENT_OFFSET + idx
+
+
+def grid_dtype(agents_num):
+    """
+    Returns the smallest unsigned integer dtype that holds the codes of agents_num
+    agents.
+    """
+    return np.min_scalar_type(AGENT_OFFSET + max(agents_num - 1, 0))
+
+
+def code_agent(code):
+    """
+    Returns the agent index stored in a cell code, or None if the cell holds no agent.
+    """
+    return code - AGENT_OFFSET if code >= AGENT_OFFSET else None
+
+
+@lru_cache(maxsize=None)
+def _ascii_lut(agents_num):
+    """
+    Builds the code -> ASCII lookup table for a grid with agents_num agents.
+    Labels are padded to the same width so rows stay aligned past 9 agents.
+    """
+    labels = [".", "#", "D"] + [str(idx) for idx in range(agents_num)]
+    width = max(len(label) for label in labels)
+    return np.array([label.rjust(width) for label in labels], dtype=object)
+
+
+def ascii_grid(grid, agents_num=None, sep=""):
+    """
+    Produces the ASCII view of an integer coded grid.
+
+    Args:
+        grid (np.ndarray): 2D array of cell codes.
+        agents_num (int): Number of agents in the episode. Defaults to the
+            highest agent index found in the grid.
+        sep (str): Separator placed between cells.
+
+    Returns:
+        list of str: One string per grid row.
+    """
+    if agents_num is None:
+        agents_num = max(int(grid.max()) - AGENT_OFFSET + 1, 0)
+    cells = _ascii_lut(agents_num)[grid]
+    return [sep.join(row) for row in cells]
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+
+class CacheMissError(KeyError):
+    """
+    Raised in replay mode when a request is not found in the cache.
+    """
+
+
+class ResponseCache:
+    """
+    Content-addressed on-disk cache of LLM responses stored in SQLite.
+
+    Responses are keyed by a hash of (model, messages, sampling params).
+
+    Modes:
+        read_through: return cached responses, call the API and store on a miss.
+        record: always call the API and store (overwrite) the response.
+        replay: only return cached responses, raise CacheMissError on a miss.
+    """
+
+    MODES = ("read_through", "record", "replay")
+
+    def __init__(
+        self, path="cache/llm_cache.sqlite", mode="read_through", max_bytes=None
+    ):
+        """
+        Opens (or creates) the cache database.
+
+        Args:
+            path (str): SQLite file path.
+            mode (str): One of MODES.
+            max_bytes (int): Size limit of the stored responses. When exceeded, the
+                least recently used entries are evicted. None means no limit.
+        """
+        if mode not in self.MODES:
+            raise ValueError(
+                f"Unknown cache mode: {mode}. Must be one of: {self.MODES}"
+            )
+        self.path = path
+        self.mode = mode
+        self.max_bytes = max_bytes
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Requests can be made from the API thread, and several processes may share the
+        # file
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, content TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.db.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_access ON responses(last_access)"
+        )
+        self.db.commit()
+
+    @staticmethod
+    def make_key(model, messages, params=None):
+        """
+        Returns the hash identifying a request.
+        """
+        request = {"model": model, "messages": messages, "params": params or {}}
+        encoded = json.dumps(
+            request, sort_keys=True, ensure_ascii=False, separators=(",", ":")
+        )
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Looks up a response according to the cache mode.
+
+        Returns:
+            str: The cached response, or None if the API must be called.
+
+        Raises:
+            CacheMissError: In replay mode, when the key is not cached.
+        """
+        if self.mode == "record":
+            return None
+
+        row = self.db.execute(
+            "SELECT content FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            if self.mode == "replay":
+                raise CacheMissError(key)
+            return None
+
+        self.db.execute(
+            "UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key)
+        )
+        self.db.commit()
+        return row[0]
+
+    def put(self, key, content):
+        """
+        Stores a response (ignored in replay mode) and evicts old entries if needed.
+        Empty responses (None or "") are not stored, so they are asked again.
+        """
+        if self.mode == "replay" or not content:
+            return
+
+        now = time.time()
+        self.db.execute(
+            "INSERT OR REPLACE INTO responses"
+            " (key, content, size, created, last_access) VALUES (?, ?, ?, ?, ?)",
+            (key, content, len(content.encode("utf-8")), now, now),
+        )
+        self.db.commit()
+
+        if self.max_bytes is not None:
+            self._evict()
+
+    def size(self):
+        """
+        Returns the total size in bytes of the stored responses.
+        """
+        return self.db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+
+    def _evict(self):
+        """
+        Deletes the least recently used entries until the cache fits in max_bytes.
+        """
+        excess = self.size() - self.max_bytes
+        if excess <= 0:
+            return
+
+        freed = 0
+        keys = []
+        for key, size in self.db.execute(
+            "SELECT key, size FROM responses ORDER BY last_access"
+        ):
+            keys.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self.db.executemany("DELETE FROM responses WHERE key = ?", keys)
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,225 @@
+import gzip
+import json
+import os
+
+import numpy as np
+from utils.grid_codes import agent_code
+from utils.grid_codes import ascii_grid
+from utils.grid_codes import DOOR
+from utils.grid_codes import EMPTY
+from utils.grid_codes import grid_dtype
+from utils.grid_codes import WALL
+from utils.memory import make_memory
+from utils.observation import make_observation
+
+_CELL_CODES = {".": EMPTY, "#": WALL, "D": DOOR}
+
+
+def iter_records(path):
+    """
+    Yields the records of a JSONL log, one at a time. Gzipped (rotated) parts
+    are read too.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def log_parts(path):
+    """
+    Returns the files of a log in order: the parts gzipped by rotation
+    (<log>.1.gz, <log>.2.gz, ...) then the live file.
+    """
+    parts = []
+    if not path.endswith(".gz"):
+        while os.path.exists(f"{path}.{len(parts) + 1}.gz"):
+            parts.append(f"{path}.{len(parts) + 1}.gz")
+    return parts + [path]
+
+
+def iter_log(path):
+    """
+    Yields the records of a whole log, rotated parts included, in order.
+    """
+    for part in log_parts(path):
+        yield from iter_records(part)
+
+
+class EpisodeLog:
+    """
+    Reader of a delta encoded episode log (see JsonLogger).
+
+    Nothing is loaded up front: turns() replays the deltas on the fly and
+    rebuilds each turn's full view only as it is requested.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Path of the episode log (the live file when it was
+                rotated, its gzipped parts are read first).
+        """
+        self.path = path
+        self._header = None
+
+    @property
+    def header(self):
+        """
+        The header record of the episode (read from the first line only).
+        """
+        if self._header is None:
+            self._header = next(iter_log(self.path))
+            if self._header.get("type") != "header":
+                raise ValueError(f"{self.path} does not start with a header record")
+        return self._header
+
+    def records(self):
+        """
+        Yields the turn, error and end records, in order.
+        """
+        records = iter_log(self.path)
+        next(records, None)  # Header
+        yield from records
+
+    def end(self):
+        """
+        Returns the end record (outcome, turns, tokens), or None if the episode was cut
+        short.
+        """
+        end = None
+        for record in self.records():
+            if record["type"] == "end":
+                end = record
+        return end
+
+    def turns(self, grid=False, prompt=False):
+        """
+        Yields the full view of every turn.
+
+        Args:
+            grid (bool): If True, adds the ASCII grid of the turn ("grid_ascii").
+            prompt (bool): If True, adds the turn JSON that was sent to the LLM
+                ("user_data"), which also requires the grid.
+
+        Yields:
+            dict: turn, door_state, agents_positions (state shown to the LLM),
+            choice (None for rejected replies), error, llm (reply) and usage.
+        """
+        header = self.header
+        agents_num = header["config"]["game"]["characters_num"]
+        order = [
+            idx for idx, _, _ in header["agents"]
+        ]  # Order of the agents in the simulation
+        positions = {idx: (x, y) for idx, x, y in header["agents"]}
+        door_state = header["door"]
+        static_grid = np.array(
+            [[_CELL_CODES[cell] for cell in row] for row in header["grid"]],
+            dtype=grid_dtype(agents_num),
+        )
+        memory = make_memory(header["config"].get("memory")) if prompt else None
+        observation = (
+            make_observation(header["config"].get("observation"), agents_num)
+            if prompt
+            else None
+        )
+
+        for record in self.records():
+            if record["type"] == "end":
+                return
+
+            agents_position = [
+                {"id": idx, "x": positions[idx][0], "y": positions[idx][1]}
+                for idx in order
+            ]
+            view = {
+                "turn": record["turn"],
+                "door_state": door_state,
+                "agents_positions": agents_position,
+                "choice": record.get("choice"),
+                "error": record.get("error"),
+                "llm": record.get("llm"),
+                "usage": record.get("usage"),
+            }
+            if grid or prompt:
+                codes = self._grid(static_grid, positions)
+                view["grid_ascii"] = ascii_grid(codes, agents_num)
+            if prompt:
+                view["user_data"] = self._user_data(memory, observation, view, codes)
+                memory.update_last(self._memory_data(record))
+            yield view
+
+            for idx, x, y in record.get("moved", []):
+                positions[idx] = (x, y)
+            if record.get("exited"):
+                self._remove_agents(order, positions, record["exited"])
+            door_state = record.get("door", door_state)
+
+    @staticmethod
+    def _remove_agents(order, positions, exited):
+        """
+        Removes exited agents like AgentRegistry.remove (swap with the last one).
+        """
+        where = {idx: index for index, idx in enumerate(order)}
+        for index in sorted((where[idx] for idx in exited), reverse=True):
+            last = order.pop()
+            if index < len(order):
+                order[index] = last
+        for idx in exited:
+            del positions[idx]
+
+    @staticmethod
+    def _grid(static_grid, positions):
+        grid = static_grid.copy()
+        for idx, (x, y) in positions.items():
+            grid[y, x] = agent_code(idx)
+        return grid
+
+    @staticmethod
+    def _user_data(memory, observation, view, grid):
+        """
+        Rebuilds the turn JSON exactly as Simulation.generate_JSON built it.
+        """
+        state = {
+            "current_turn": view["turn"],
+            "current_door_state": view["door_state"],
+            **observation.encode(view["agents_positions"], grid),
+        }
+        state_json = json.dumps(state, ensure_ascii=False, separators=(",", ":"))
+        user_data = '{"previous_turn_memory":' + memory.to_json() + "," + state_json[1:]
+        memory.add_turn(view["turn"], view["door_state"], view["agents_positions"])
+        return user_data
+
+    @staticmethod
+    def _memory_data(record):
+        """
+        The memory entry fields that the simulation added after this turn.
+        """
+        if record["type"] == "error":
+            return {
+                "action_taken_on_turn": record["error"],
+                "turn_prev_reasoning": record["message"],
+                "key_action_map": "",
+                "turn_next_reasoning": "",
+            }
+        llm = record["llm"]
+        return {
+            "action_taken_on_turn": record["choice"],
+            "turn_prev_reasoning": llm["prev_reasoning"],
+            "key_action_map": llm["key_action_map"],
+            "turn_next_reasoning": llm["next_reasoning"],
+        }
+
+
+if __name__ == "__main__":
+    import sys
+
+    log = EpisodeLog(sys.argv[1])
+    print(
+        json.dumps({key: value for key, value in log.header.items() if key != "grid"})
+    )
+    for view in log.turns(grid=True):
+        print(view["turn"], view["choice"] or view["error"], view["door_state"])
+        print("\n".join(view["grid_ascii"]))
+    print(log.end())
@@ -0,0 +1,234 @@
+import json
+from collections import deque
+
+
+def _encode(entry):
+    """
+    Compact JSON encoding used for every memory entry.
+    """
+    return json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+
+
+class TurnMemory:
+    """
+    Memory of previous turns sent to the LLM, keeping every turn.
+
+    Each turn is added with add_turn() and later completed with the LLM data
+    through update_last(). Entries are encoded once, when they can no longer
+    change, so to_json() only joins cached strings.
+    """
+
+    def __init__(self):
+        self._finalized = ""  # Encoded entries that will not change anymore
+        self._count = 0
+        self._last = None  # Last entry, still waiting for its LLM data
+
+    def __len__(self):
+        return self._count + (self._last is not None)
+
+    def add_turn(self, turn, door_state, agents_position):
+        """
+        Adds the state observed at the start of a turn.
+
+        Args:
+            turn (int): Turn number.
+            door_state (str): Door state on this turn.
+            agents_position (list of dict): Agents positions on this turn.
+        """
+        if self._last is not None:
+            self._finalize(self._last, _encode(self._last))
+        self._last = self._make_entry(turn, door_state, agents_position)
+
+    def update_last(self, llm_data):
+        """
+        Completes the last turn with the action and reasoning sent by the LLM.
+        """
+        if self._last is not None:
+            self._last.update(llm_data)
+
+    def to_json(self):
+        """
+        Returns the memory as a compact JSON array.
+        """
+        parts = [part for part in (self._finalized_json(), self._last_json()) if part]
+        return "[" + ",".join(parts) + "]"
+
+    def _make_entry(self, turn, door_state, agents_position):
+        return {
+            "turn": turn,
+            "turn_door_state": door_state,
+            "agents_positions_on_turn": [agents_position],
+        }
+
+    def _finalize(self, entry, encoded):
+        self._finalized = f"{self._finalized},{encoded}" if self._finalized else encoded
+        self._count += 1
+
+    def _finalized_json(self):
+        return self._finalized
+
+    def _last_json(self):
+        return _encode(self._last) if self._last is not None else ""
+
+
+class SlidingWindowMemory(TurnMemory):
+    """
+    Keeps only the last `window` turns.
+    """
+
+    def __init__(self, window=10):
+        super().__init__()
+        self.window = window
+        self._entries = deque(maxlen=max(window - 1, 0))
+
+    def __len__(self):
+        return len(self._entries) + (self._last is not None)
+
+    def _finalize(self, entry, encoded):
+        if self._entries.maxlen:
+            self._entries.append((entry, encoded))
+
+    def _finalized_json(self):
+        return ",".join(encoded for _, encoded in self._entries)
+
+    def _last_json(self):
+        return super()._last_json() if self.window > 0 else ""
+
+
+class DeltaMemory(TurnMemory):
+    """
+    Keeps every turn, but stores agent positions as deltas: the first turn has
+    the full positions, later turns only list the agents that moved or exited.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._positions = None
+
+    def _make_entry(self, turn, door_state, agents_position):
+        positions = {agent["id"]: (agent["x"], agent["y"]) for agent in agents_position}
+        previous, self._positions = self._positions, positions
+
+        if previous is None:
+            return super()._make_entry(turn, door_state, agents_position)
+
+        moved = [
+            agent
+            for agent in agents_position
+            if previous.get(agent["id"]) != positions[agent["id"]]
+        ]
+        exited = [idx for idx in previous if idx not in positions]
+        entry = {
+            "turn": turn,
+            "turn_door_state": door_state,
+            "agents_moved_on_turn": moved,
+        }
+        if exited:
+            entry["agents_exited_on_turn"] = exited
+        return entry
+
+
+class CompactingMemory(SlidingWindowMemory):
+    """
+    Keeps the last `window` turns in full and, every `compact_every` turns,
+    folds the older ones into a summary whose size doesn't grow with the
+    episode: the range of summarized turns, how often each action was taken,
+    how many turns the door was open or closed, the last summarized agents
+    positions and one line for each of the latest `summary_lines` turns.
+    """
+
+    def __init__(self, window=10, compact_every=10, summary_lines=10):
+        super().__init__(window)
+        self.compact_every = compact_every
+        self._pending = []  # Entries that left the window but are not summarized yet
+        self._turns = None  # [first, last] summarized turn
+        self._actions = {}  # Action taken -> number of summarized turns
+        self._door_turns = {}  # Door state -> number of summarized turns
+        self._positions = ""  # Agents positions on the last summarized turn
+        self._lines = deque(maxlen=summary_lines)
+        self._summary_json = ""
+
+    def _finalize(self, entry, encoded):
+        if len(self._entries) == self._entries.maxlen:
+            self._pending.append(
+                self._entries[0] if self._entries.maxlen else (entry, encoded)
+            )
+        super()._finalize(entry, encoded)
+
+        if len(self._pending) >= self.compact_every:
+            for pending, _ in self._pending:
+                self._fold(pending)
+            self._pending = []
+            self._summary_json = _encode({"summary_of_older_turns": self._summary()})
+
+    def _finalized_json(self):
+        parts = (
+            [self._summary_json]
+            + [encoded for _, encoded in self._pending]
+            + [super()._finalized_json()]
+        )
+        return ",".join(part for part in parts if part)
+
+    def _fold(self, entry):
+        """
+        Adds a turn to the summary counters.
+        """
+        turn = entry["turn"]
+        self._turns = [self._turns[0] if self._turns else turn, turn]
+        action = entry.get("action_taken_on_turn")
+        self._actions[action] = self._actions.get(action, 0) + 1
+        door_state = entry["turn_door_state"]
+        self._door_turns[door_state] = self._door_turns.get(door_state, 0) + 1
+        self._positions = self._agents(entry)
+        self._lines.append(self._summarize(entry))
+
+    def _summary(self):
+        return {
+            "turns": self._turns,
+            "turns_per_action": self._actions,
+            "turns_per_door_state": self._door_turns,
+            "last_agents_positions": self._positions,
+            "latest_turns": list(self._lines),
+        }
+
+    @staticmethod
+    def _agents(entry):
+        positions = entry.get("agents_positions_on_turn", [[]])[0]
+        return " ".join(
+            f"{agent['id']}:({agent['x']},{agent['y']})" for agent in positions
+        )
+
+    def _summarize(self, entry):
+        return (
+            f"turn {entry['turn']}: door {entry['turn_door_state']}, "
+            f"agents {self._agents(entry)}, pressed {entry.get('action_taken_on_turn')}"
+        )
+
+
+def make_memory(config=None):
+    """
+    Creates the memory strategy described by the `memory` configuration section.
+
+    Args:
+        config (dict): e.g. {"strategy": "compact", "window": 10, "compact_every": 10,
+            "summary_lines": 10}. strategy is one of "full" (default), "window",
+            "delta" or "compact".
+
+    Returns:
+        TurnMemory: The memory instance.
+    """
+    config = config or {}
+    strategy = config.get("strategy", "full")
+    window = config.get("window", 10)
+
+    if strategy == "full":
+        return TurnMemory()
+    if strategy == "window":
+        return SlidingWindowMemory(window)
+    if strategy == "delta":
+        return DeltaMemory()
+    if strategy == "compact":
+        return CompactingMemory(
+            window, config.get("compact_every", 10), config.get("summary_lines", 10)
+        )
+    raise ValueError(f"Unknown memory strategy: {strategy}")
@@ -0,0 +1,236 @@
+"""
+In-process metrics (counters and histograms) of the LLM requests and turns,
+exported as Prometheus text or JSON, to a file or a local HTTP endpoint.
+"""
+
+import bisect
+import json
+import threading
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536, 131072)
+BYTE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Buckets of the histograms recorded by the simulation
+BUCKETS = {
+    "llm_request_seconds": LATENCY_BUCKETS,
+    "turn_seconds": LATENCY_BUCKETS,
+    "llm_ttft_seconds": LATENCY_BUCKETS,
+    "llm_prompt_tokens": TOKEN_BUCKETS,
+    "llm_completion_tokens": TOKEN_BUCKETS,
+    "llm_cached_tokens": TOKEN_BUCKETS,
+    "llm_payload_bytes": BYTE_BUCKETS,
+    "llm_reply_bytes": BYTE_BUCKETS,
+}
+
+
+class Histogram:
+    """
+    Cumulative histogram with fixed bucket upper bounds, like Prometheus ones.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, data):
+        for idx, count in enumerate(data["counts"]):
+            self.counts[idx] += count
+        self.sum += data["sum"]
+        self.count += data["count"]
+
+    def to_dict(self):
+        return {
+            "buckets": list(self.buckets),
+            "counts": list(self.counts),
+            "sum": self.sum,
+            "count": self.count,
+        }
+
+
+def _labels_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+
+class MetricsRegistry:
+    """
+    Thread-safe set of labeled counters and histograms.
+
+    Snapshots (to_dict) can be merged into another registry, which is how the
+    metrics of worker processes are gathered in the parent.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}  # name -> labels -> value
+        self.histograms = {}  # name -> labels -> Histogram
+
+    def inc(self, name, value=1, **labels):
+        """
+        Adds value to a counter.
+        """
+        key = _labels_key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """
+        Records a value in a histogram (buckets from BUCKETS, latency ones by default).
+        """
+        key = _labels_key(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = Histogram(BUCKETS.get(name, LATENCY_BUCKETS))
+            series[key].observe(value)
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.histograms = {}
+
+    def to_dict(self):
+        """
+        Returns a JSON serializable snapshot of every metric.
+        """
+        with self._lock:
+            return {
+                "counters": {
+                    name: [
+                        {"labels": dict(key), "value": value}
+                        for key, value in series.items()
+                    ]
+                    for name, series in self.counters.items()
+                },
+                "histograms": {
+                    name: [
+                        {"labels": dict(key), **histogram.to_dict()}
+                        for key, histogram in series.items()
+                    ]
+                    for name, series in self.histograms.items()
+                },
+            }
+
+    def drain(self):
+        """
+        Returns a snapshot and resets the registry.
+        """
+        with self._lock:
+            counters, histograms = self.counters, self.histograms
+            self.counters, self.histograms = {}, {}
+        registry = MetricsRegistry()
+        registry.counters, registry.histograms = counters, histograms
+        return registry.to_dict()
+
+    def merge(self, snapshot):
+        """
+        Adds a snapshot (from to_dict or drain) to this registry.
+        """
+        for name, series in snapshot["counters"].items():
+            for entry in series:
+                self.inc(name, entry["value"], **entry["labels"])
+        with self._lock:
+            for name, series in snapshot["histograms"].items():
+                for entry in series:
+                    key = _labels_key(entry["labels"])
+                    histograms = self.histograms.setdefault(name, {})
+                    if key not in histograms:
+                        histograms[key] = Histogram(entry["buckets"])
+                    histograms[key].merge(entry)
+
+    def to_prometheus(self):
+        """
+        Returns the metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                for key, value in series.items():
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip(
+                        list(histogram.buckets) + ["+Inf"], histogram.counts
+                    ):
+                        cumulative += count
+                        labels = _format_labels(key, [("le", bound)])
+                        lines.append(f"{name}_bucket{labels} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {histogram.sum}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """
+        Writes the metrics to a file: JSON if the path ends with .json, else Prometheus
+        text.
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            if path.endswith(".json"):
+                json.dump(self.to_dict(), f, indent=2)
+            else:
+                f.write(self.to_prometheus())
+
+    def serve(self, port, host="127.0.0.1"):
+        """
+        Serves the metrics over HTTP from a daemon thread: /metrics (Prometheus
+        text) and /metrics.json.
+
+        Returns:
+            ThreadingHTTPServer: The server (call shutdown() to stop it).
+        """
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics.json":
+                    body, content_type = (
+                        json.dumps(registry.to_dict()),
+                        "application/json",
+                    )
+                elif self.path == "/metrics":
+                    body, content_type = (
+                        registry.to_prometheus(),
+                        "text/plain; version=0.0.4",
+                    )
+                else:
+                    self.send_error(404)
+                    return
+                body = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Keep the simulation output clean
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(
+            target=server.serve_forever, name="metrics-server", daemon=True
+        ).start()
+        return server
+
+
+# Registry of the process, filled by the API backends and the simulation
+METRICS = MetricsRegistry()
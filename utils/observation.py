@@ -0,0 +1,329 @@
+"""
+Encodings of the current state sent to the LLM every turn.
+
+The turn JSON always has current_turn and current_door_state; the encoder
+chooses how the grid and the agents are shown:
+
+- "full": agents positions and the whole ASCII grid (the original format).
+- "sparse": grid size, door cells and [id, x, y] agents only.
+- "rle": the grid alone, every row run-length encoded.
+- "diff": the sparse state on the first turn, then the grid size, door
+  cells and only the agents that moved or exited since the previous turn.
+
+Every turn JSON is self-contained as far as the board goes: each request
+only carries the system prefix and the current turn, so the layout (grid
+size and door cells) is repeated on every turn.
+
+estimate_tokens() gives a local token count estimate, so the encodings can be
+compared on a board before picking one (see compare_encodings and the
+"observation" benchmark).
+"""
+
+import json
+import re
+
+import numpy as np
+from utils.grid_codes import agent_code
+from utils.grid_codes import ascii_grid
+from utils.grid_codes import DOOR
+from utils.grid_codes import EMPTY
+from utils.grid_codes import WALL
+
+# Pieces a BPE tokenizer usually keeps apart: words, numbers of up to three
+# digits and single punctuation marks
+_TOKEN_PATTERN = re.compile(r"[A-Za-z_]+|\d{1,3}|[^\sA-Za-z\d]|\s+")
+
+_RLE_SYMBOLS = {EMPTY: ".", WALL: "#", DOOR: "D"}
+_RLE_CODES = {symbol: code for code, symbol in _RLE_SYMBOLS.items()}
+
+
+def estimate_tokens(text):
+    """
+    Estimates the number of tokens of a text without calling a tokenizer.
+
+    Args:
+        text (str): The text, e.g. a turn JSON.
+
+    Returns:
+        int: The estimated token count.
+    """
+    return len(_TOKEN_PATTERN.findall(text))
+
+
+def _encode(fields):
+    return json.dumps(fields, ensure_ascii=False, separators=(",", ":"))
+
+
+class FullObservation:
+    """
+    Agents positions and the whole ASCII grid (one string per row).
+    """
+
+    name = "full"
+    description = ""  # The format the initial context already explains
+
+    def __init__(self, agents_num):
+        self.agents_num = agents_num
+
+    def encode(self, agents_position, grid):
+        """
+        Encodes the current state.
+
+        Args:
+            agents_position (list of dict): {"id", "x", "y"} of every agent.
+            grid (np.ndarray): 2D array of cell codes (see utils.grid_codes).
+
+        Returns:
+            dict: Fields added to the turn JSON after the turn and door state.
+        """
+        return {
+            "current_agents_positions": agents_position,
+            "current_grid_ascii": ascii_grid(grid, self.agents_num),
+        }
+
+    def estimate_tokens(self, fields):
+        """
+        Returns the estimated token count of encoded fields.
+        """
+        return estimate_tokens(_encode(fields))
+
+
+class SparseObservation(FullObservation):
+    """
+    Coordinates only: the grid size (walls included), the door cells and
+    [id, x, y] of every agent. The grid is walls on the border, empty inside.
+    """
+
+    name = "sparse"
+    description = (
+        "The grid is not drawn: grid_size is [width, height] including the walls on "
+        "the border, door_cells lists the [x, y] door cells and "
+        "current_agents_positions lists [id, x, y] of every agent."
+    )
+
+    def __init__(self, agents_num):
+        super().__init__(agents_num)
+        self._layout = None  # Grid size and door cells, they never change
+
+    def _static_fields(self, grid):
+        if self._layout is None:
+            door_cells = [[int(x), int(y)] for y, x in np.argwhere(grid == DOOR)]
+            self._layout = {
+                "grid_size": [grid.shape[1], grid.shape[0]],
+                "door_cells": door_cells,
+            }
+        return self._layout
+
+    def encode(self, agents_position, grid):
+        return {
+            **self._static_fields(grid),
+            "current_agents_positions": [
+                [agent["id"], agent["x"], agent["y"]] for agent in agents_position
+            ],
+        }
+
+
+class RunLengthObservation(FullObservation):
+    """
+    The grid alone, every row run-length encoded.
+    """
+
+    name = "rle"
+    description = (
+        "The grid is given in current_grid_rle, one string per row with cells "
+        "separated by spaces: '.' empty, '#' wall, 'D' door and numbers are agent ids; "
+        "a count before a symbol repeats it (e.g. '5.' is five empty cells)."
+    )
+
+    def encode(self, agents_position, grid):
+        return {"current_grid_rle": _rle_rows(grid)}
+
+
+class DiffObservation(SparseObservation):
+    """
+    The sparse state on the first turn, then the layout and the agents that
+    moved ([id, x, y]) or exited since the previous turn.
+    """
+
+    name = "diff"
+    description = (
+        "grid_size is [width, height] including the walls on the border and door_cells "
+        "lists the [x, y] door cells. On the first turn current_agents_positions lists "
+        "[id, x, y] of every agent; on later turns only current_agents_moved ([id, x, "
+        "y]) and current_agents_exited (ids) since the previous turn are given, the "
+        "other agents stay where the memory last showed them."
+    )
+
+    def __init__(self, agents_num):
+        super().__init__(agents_num)
+        self._positions = None
+
+    def encode(self, agents_position, grid):
+        positions = {agent["id"]: (agent["x"], agent["y"]) for agent in agents_position}
+        previous, self._positions = self._positions, positions
+        if previous is None:
+            return super().encode(agents_position, grid)
+
+        fields = {
+            **self._static_fields(grid),
+            "current_agents_moved": [
+                [idx, x, y]
+                for idx, (x, y) in positions.items()
+                if previous.get(idx) != (x, y)
+            ],
+        }
+        exited = [idx for idx in previous if idx not in positions]
+        if exited:
+            fields["current_agents_exited"] = exited
+        return fields
+
+
+def _rle_rows(grid):
+    """
+    Run-length encodes every row of a grid of cell codes. Agents are unique,
+    so only empty, wall and door cells form runs.
+    """
+    width = grid.shape[1]
+    flat = grid.ravel()
+    # A run starts on every change and every row start
+    starts = np.ones(flat.size, dtype=bool)
+    starts[1:] = flat[1:] != flat[:-1]
+    starts[::width] = True
+    starts = np.flatnonzero(starts)
+    lengths = np.diff(np.append(starts, flat.size)).tolist()
+
+    rows = [[] for _ in range(grid.shape[0])]
+    for start, length, code in zip(starts.tolist(), lengths, flat[starts].tolist()):
+        symbol = _RLE_SYMBOLS.get(code)
+        if symbol is None:  # An agent
+            symbol = str(code - agent_code(0))
+        rows[start // width].append(symbol if length == 1 else f"{length}{symbol}")
+    return [" ".join(cells) for cells in rows]
+
+
+def _rle_decode_row(text):
+    """
+    Returns the cell codes of a run-length encoded row.
+    """
+    codes = []
+    for cell in text.split():
+        if cell.isdigit():
+            codes.append(agent_code(int(cell)))
+        else:
+            codes.extend([_RLE_CODES[cell[-1]]] * int(cell[:-1] or 1))
+    return codes
+
+
+ENCODINGS = {
+    "full": FullObservation,
+    "sparse": SparseObservation,
+    "rle": RunLengthObservation,
+    "diff": DiffObservation,
+}
+
+
+def make_observation(config=None, agents_num=0):
+    """
+    Creates the encoder described by the `observation` configuration section.
+
+    Args:
+        config (dict): e.g. {"encoding": "sparse"}. encoding is one of "full"
+            (default), "sparse", "rle" or "diff".
+        agents_num (int): Number of agents in the episode.
+
+    Returns:
+        FullObservation: The encoder, to be used for a single episode.
+    """
+    config = config or {}
+    encoding = config.get("encoding", "full")
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown observation encoding: {encoding}")
+    return ENCODINGS[encoding](agents_num)
+
+
+def compare_encodings(agents_position, grid, agents_num):
+    """
+    Estimates the tokens of the current state with every encoding (for "diff",
+    the first turn one).
+
+    Returns:
+        dict: encoding name -> estimated token count.
+    """
+    estimates = {}
+    for name, encoder_class in ENCODINGS.items():
+        encoder = encoder_class(agents_num)
+        estimates[name] = encoder.estimate_tokens(encoder.encode(agents_position, grid))
+    return estimates
+
+
+class ObservationDecoder:
+    """
+    Turns the turn JSONs of any encoding back into the full one, so consumers
+    written for it (e.g. the stub policies) work with every encoding. Feed it
+    the turns of an episode in order.
+    """
+
+    def __init__(self):
+        self.positions = {}  # id -> (x, y)
+        self.static_grid = None  # Walls and doors
+
+    def decode(self, observation):
+        """
+        Args:
+            observation (dict): A turn JSON.
+
+        Returns:
+            dict: The turn JSON with current_agents_positions and current_grid_ascii.
+        """
+        if "current_grid_ascii" in observation:
+            return observation
+
+        if "current_grid_rle" in observation:
+            grid = np.array(
+                [_rle_decode_row(row) for row in observation["current_grid_rle"]]
+            )
+            agents = grid >= agent_code(0)
+            self.static_grid = np.where(agents, EMPTY, grid)
+            self.positions = {
+                int(grid[y, x]) - agent_code(0): (int(x), int(y))
+                for y, x in np.argwhere(agents)
+            }
+        elif "current_agents_positions" in observation:
+            self.static_grid = self._layout_grid(
+                observation["grid_size"], observation["door_cells"]
+            )
+            self.positions = {
+                idx: (x, y) for idx, x, y in observation["current_agents_positions"]
+            }
+        else:
+            for idx, x, y in observation.get("current_agents_moved", []):
+                self.positions[idx] = (x, y)
+            for idx in observation.get("current_agents_exited", []):
+                del self.positions[idx]
+
+        grid = self.static_grid.copy()
+        for idx, (x, y) in self.positions.items():
+            grid[y, x] = agent_code(idx)
+        decoded = {
+            key: observation[key]
+            for key in ("current_turn", "current_door_state")
+            if key in observation
+        }
+        decoded["current_agents_positions"] = [
+            {"id": idx, "x": x, "y": y}
+            for idx, (x, y) in sorted(self.positions.items())
+        ]
+        decoded["current_grid_ascii"] = ascii_grid(grid)
+        if "previous_turn_memory" in observation:
+            decoded["previous_turn_memory"] = observation["previous_turn_memory"]
+        return decoded
+
+    @staticmethod
+    def _layout_grid(size, door_cells):
+        width, height = size
+        grid = np.full((height, width), EMPTY, dtype=np.int64)
+        grid[[0, -1], :] = WALL
+        grid[:, [0, -1]] = WALL
+        for x, y in door_cells:
+            grid[y, x] = DOOR
+        return grid
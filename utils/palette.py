@@ -0,0 +1,36 @@
+import colorsys
+
+# Colors of the first agents, as in the original fixed palette
+BASE_COLORS = [
+    (255, 0, 0),  # Red
+    (0, 255, 0),  # Green
+    (0, 0, 255),  # Blue
+    (255, 255, 0),  # Yellow
+    (255, 165, 0),  # Orange
+    (128, 0, 128),  # Purple
+    (0, 255, 255),  # Cyan
+    (255, 192, 203),  # Pink
+    (255, 140, 0),  # Dark Orange
+]
+
+_GOLDEN_RATIO = 0.618033988749895
+
+
+def agent_color(idx):
+    """
+    Returns the RGB color of an agent. Past the base palette, hues are spread
+    with the golden ratio so neighbouring ids get clearly different colors.
+
+    Args:
+        idx (int): Agent index.
+
+    Returns:
+        tuple: RGB color.
+    """
+    if idx < len(BASE_COLORS):
+        return BASE_COLORS[idx]
+    hue = (idx * _GOLDEN_RATIO) % 1.0
+    saturation = 0.55 + 0.45 * (idx % 2)
+    value = 0.95 - 0.25 * ((idx // 2) % 2)
+    r, g, b = colorsys.hsv_to_rgb(hue, saturation, value)
+    return int(r * 255), int(g * 255), int(b * 255)
@@ -0,0 +1,128 @@
+"""
+Switchable timing spans around the phases of a turn, exported as Chrome
+trace-event JSON (open it in chrome://tracing or https://ui.perfetto.dev).
+"""
+
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextlib import nullcontext
+
+
+class Profiler:
+    """
+    Collects complete ("X") trace events. Disabled by default: spans then cost a
+    single attribute check.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.events = []
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    @contextmanager
+    def _span(self, name, category, args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            event = {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": start * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+            }
+            if args:
+                event["args"] = args
+            with self._lock:
+                self.events.append(event)
+
+    def span(self, name, category="simulation", **args):
+        """
+        Context manager timing a block as a trace event.
+
+        Args:
+            name (str): Event name, e.g. "simulation.generate_JSON".
+            category (str): Event category.
+            **args: Extra data shown with the event.
+        """
+        if not self.enabled:
+            return nullcontext()
+        return self._span(name, category, args)
+
+    def traced(self, name, category="simulation"):
+        """
+        Decorator timing every call of a function as a trace event.
+        """
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self._span(name, category, None):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def drain(self):
+        """
+        Returns the recorded events and clears them.
+        """
+        with self._lock:
+            events, self.events = self.events, []
+        return events
+
+    def extend(self, events):
+        """
+        Adds events recorded elsewhere (e.g. in a worker process).
+        """
+        with self._lock:
+            self.events.extend(events)
+
+    def write_chrome_trace(self, path):
+        """
+        Writes the recorded events as a Chrome trace-event JSON file.
+        """
+        with self._lock:
+            events = list(self.events)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+@contextmanager
+def profile_to(path):
+    """
+    Runs a block under cProfile and dumps the stats to path (read them with
+    pstats or snakeviz). Does nothing if path is None.
+    """
+    if path is None:
+        yield
+        return
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        profile.dump_stats(path)
+
+
+# Profiler of the process, used by the simulation and the API backends
+PROFILER = Profiler()
@@ -0,0 +1,110 @@
+"""
+Token bucket rate limiting of the LLM requests of a provider (requests and
+tokens per minute), for the asyncio backends.
+"""
+
+import asyncio
+import time
+
+from utils.metrics import METRICS
+
+
+class TokenBucket:
+    """
+    Bucket refilled continuously at `rate` units per second, up to `capacity`.
+
+    Waiters are served in arrival order. The level may go negative when more
+    was spent than budgeted (see settle), which delays the next acquirers.
+    """
+
+    def __init__(self, rate, capacity):
+        """
+        Args:
+            rate (float): Units added per second.
+            capacity (float): Maximum level (the allowed burst).
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.level = capacity
+        self.updated = time.monotonic()
+        self._lock = None  # Created on first use, inside the event loop
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        """
+        Waits until amount units are available and takes them. Amounts above
+        the capacity are capped to it, so they can still go through.
+
+        Returns:
+            float: Time waited, in seconds.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        amount = min(amount, self.capacity)
+        started = time.monotonic()
+        async with self._lock:
+            self._refill()
+            while self.level < amount:
+                await asyncio.sleep((amount - self.level) / self.rate)
+                self._refill()
+            self.level -= amount
+        return time.monotonic() - started
+
+    def settle(self, amount):
+        """
+        Takes amount more units without waiting (gives them back if negative).
+        """
+        self._refill()
+        self.level = min(self.capacity, self.level - amount)
+
+
+class ProviderLimiter:
+    """
+    Request and token budgets of a provider, shared by every model and episode
+    that calls it.
+    """
+
+    def __init__(self, name, requests_per_minute=None, tokens_per_minute=None):
+        """
+        Args:
+            name (str): Provider name, used as the metrics label.
+            requests_per_minute (float): Request budget, None for no limit.
+            tokens_per_minute (float): Token budget (prompt + completion), None for no
+                limit.
+        """
+        self.name = name
+        self.requests = (
+            TokenBucket(requests_per_minute / 60, requests_per_minute)
+            if requests_per_minute
+            else None
+        )
+        self.tokens = (
+            TokenBucket(tokens_per_minute / 60, tokens_per_minute)
+            if tokens_per_minute
+            else None
+        )
+
+    async def acquire(self, tokens):
+        """
+        Waits for one request and the estimated tokens of a request.
+        """
+        waited = 0.0
+        if self.requests is not None:
+            waited += await self.requests.acquire(1)
+        if self.tokens is not None:
+            waited += await self.tokens.acquire(tokens)
+        METRICS.observe("llm_rate_limit_wait_seconds", waited, provider=self.name)
+
+    def settle(self, tokens):
+        """
+        Corrects the token budget once the real usage is known.
+
+        Args:
+            tokens (int): Tokens spent beyond the estimate (negative if fewer).
+        """
+        if self.tokens is not None:
+            self.tokens.settle(tokens)
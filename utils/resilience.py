@@ -0,0 +1,93 @@
+import random
+import threading
+from collections import deque
+
+
+class LatencyTracker:
+    """
+    Rolling window of the latencies of successful requests.
+    """
+
+    def __init__(self, window=200):
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._latencies)
+
+    def add(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def percentile(self, p):
+        """
+        Returns the p-th percentile (0 to 100) of the window, None if it is empty.
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if not latencies:
+            return None
+        index = min(int(len(latencies) * p / 100), len(latencies) - 1)
+        return latencies[index]
+
+
+class RetryPolicy:
+    """
+    How a failed or slow LLM request is retried: exponential backoff with
+    jitter between attempts, and an optional hedged duplicate request sent
+    when the first one is slower than a latency percentile.
+    """
+
+    def __init__(
+        self,
+        max_retries=3,
+        backoff_base=0.5,
+        backoff_max=30.0,
+        jitter=True,
+        hedge_percentile=None,
+        hedge_min_samples=20,
+        latency_window=200,
+        seed=None,
+    ):
+        """
+        Args:
+            max_retries (int): Retries after the first attempt (per model).
+            backoff_base (float): Delay before the first retry, in seconds; it
+                doubles on every retry.
+            backoff_max (float): Maximum delay between attempts, in seconds.
+            jitter (bool): If True, the delay is drawn uniformly between 0 and
+                the backoff ("full jitter"), so clients don't retry in lockstep.
+            hedge_percentile (float): If set, a duplicate request is sent when
+                the first one takes longer than this latency percentile (e.g. 95).
+                The first reply wins.
+            hedge_min_samples (int): Latencies needed before hedging starts.
+            latency_window (int): Number of recent latencies kept for the percentile.
+            seed: Seed of the jitter random stream.
+        """
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.latencies = LatencyTracker(latency_window)
+        self.rng = random.Random(seed)
+
+    def delay(self, attempt):
+        """
+        Returns the wait before retry number attempt + 1, in seconds.
+        """
+        backoff = min(self.backoff_max, self.backoff_base * 2**attempt)
+        return self.rng.uniform(0, backoff) if self.jitter else backoff
+
+    def hedge_delay(self):
+        """
+        Returns how long to wait for a request before hedging it, or None when
+        hedging is off or there are not enough latencies yet.
+        """
+        if (
+            self.hedge_percentile is None
+            or len(self.latencies) < self.hedge_min_samples
+        ):
+            return None
+        return self.latencies.percentile(self.hedge_percentile)
@@ -0,0 +1,234 @@
+"""
+Incremental check of a streamed LLM reply, so a stream can be cancelled as
+soon as it can no longer become the JSON object the simulation expects.
+"""
+
+REQUIRED_FIELDS = ("choice", "prev_reasoning", "next_reasoning", "key_action_map")
+
+_FENCE = "```json"  # Accepted before the object, like process_api_response does
+_WHITESPACE = " \t\n\r"
+_NUMBER_CHARS = set("0123456789+-.eE")
+_LITERALS = ("true", "false", "null")
+_ESCAPES = {
+    '"': '"',
+    "\\": "\\",
+    "/": "/",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+}
+
+# What the parser expects next, outside strings, numbers and literals
+_VALUE = "value"
+_KEY_OR_END = "key or end"  # Right after "{"
+_KEY = "key"  # After ","
+_COLON = "colon"
+_OBJECT_NEXT = "object comma or end"
+_VALUE_OR_END = "value or end"  # Right after "["
+_ARRAY_NEXT = "array comma or end"
+_DONE = "done"
+
+
+class IncrementalJsonChecker:
+    """
+    Pushdown JSON syntax checker fed with the chunks of a reply.
+
+    feed() returns False once the text can't become a JSON object holding the
+    required fields at the top level: text before the object (other than a
+    ```json fence), a syntax error, the object closing without a required
+    field, or text after it (other than a closing fence). Number grammar is
+    checked loosely; json.loads still validates the complete reply.
+    """
+
+    def __init__(self, required_fields=REQUIRED_FIELDS):
+        self.required = set(required_fields)
+        self.keys = set()  # Keys of the top level object seen so far
+        self.failed = None  # Reason, once the reply is known to be invalid
+        self._prefix = ""  # Text before the object
+        self._started = False
+        self._stack = []  # "{" or "["
+        self._expect = _VALUE
+        self._string = None  # Characters of the string being read, None outside strings
+        self._escape = 0  # 1 after a backslash, then the \\u hex digits left + 1
+        self._hex = ""  # Hex digits of the \\u escape being read
+        self._is_key = False
+        self._literal = None  # (literal, characters read)
+        self._in_number = False
+
+    @property
+    def complete(self):
+        """
+        True once the top level object is closed.
+        """
+        return self._expect == _DONE
+
+    def feed(self, text):
+        """
+        Checks the next chunk of the reply.
+
+        Returns:
+            bool: False if the reply can no longer be valid.
+        """
+        if self.failed is not None:
+            return False
+        for char in text:
+            if not self._feed_char(char):
+                return False
+        return True
+
+    def _fail(self, reason):
+        self.failed = reason
+        return False
+
+    def _feed_char(self, char):
+        if not self._started:
+            if char == "{":
+                self._started = True
+                self._open("{")
+                return True
+            if char in _WHITESPACE:
+                return True
+            self._prefix += char
+            if not _FENCE.startswith(self._prefix):
+                return self._fail("text before the JSON object")
+            return True
+
+        if self._string is not None:
+            return self._feed_string(char)
+        if self._literal is not None:
+            literal, read = self._literal
+            if read < len(literal):
+                if char != literal[read]:
+                    return self._fail(f"invalid literal, expected {literal}")
+                self._literal = (literal, read + 1)
+                return True
+            self._literal = None
+            self._value_done()
+        if self._in_number:
+            if char in _NUMBER_CHARS:
+                return True
+            self._in_number = False
+            self._value_done()
+
+        if char in _WHITESPACE:
+            return True
+        expect = self._expect
+
+        if expect == _DONE:
+            if char == "`":
+                return True  # Closing fence
+            return self._fail("text after the JSON object")
+
+        if expect in (_KEY_OR_END, _KEY):
+            if char == '"':
+                self._string, self._is_key = [], True
+                return True
+            if char == "}" and expect == _KEY_OR_END:
+                return self._close("{")
+            return self._fail("expected a key")
+
+        if expect == _COLON:
+            if char == ":":
+                self._expect = _VALUE
+                return True
+            return self._fail("expected ':'")
+
+        if expect == _OBJECT_NEXT:
+            if char == ",":
+                self._expect = _KEY
+                return True
+            if char == "}":
+                return self._close("{")
+            return self._fail("expected ',' or '}'")
+
+        if expect == _ARRAY_NEXT:
+            if char == ",":
+                self._expect = _VALUE
+                return True
+            if char == "]":
+                return self._close("[")
+            return self._fail("expected ',' or ']'")
+
+        # A value (possibly the end of an empty array)
+        if char == "]" and expect == _VALUE_OR_END:
+            return self._close("[")
+        return self._start_value(char)
+
+    def _start_value(self, char):
+        if char == '"':
+            self._string, self._is_key = [], False
+        elif char in "{[":
+            self._open(char)
+        elif char in "-0123456789":
+            self._in_number = True
+        else:
+            for literal in _LITERALS:
+                if char == literal[0]:
+                    self._literal = (literal, 1)
+                    return True
+            return self._fail("expected a value")
+        return True
+
+    def _feed_string(self, char):
+        if self._escape:
+            # Keys keep the decoded character, so "\\u0063hoice" counts as "choice"
+            if self._escape == 1:
+                if char == "u":
+                    self._escape, self._hex = 5, ""  # Four hex digits follow
+                    return True
+                if char not in _ESCAPES:
+                    return self._fail("invalid escape")
+                self._escape = 0
+                decoded = _ESCAPES[char]
+            else:
+                if char not in "0123456789abcdefABCDEF":
+                    return self._fail("invalid \\u escape")
+                self._hex += char
+                if self._escape > 2:
+                    self._escape -= 1
+                    return True
+                self._escape = 0
+                decoded = chr(int(self._hex, 16))
+            if self._is_key:
+                self._string.append(decoded)
+            return True
+        if char == "\\":
+            self._escape = 1
+            return True
+        if char == '"':
+            if self._is_key:
+                if len(self._stack) == 1:
+                    self.keys.add("".join(self._string))
+                self._expect = _COLON
+            else:
+                self._value_done()
+            self._string = None
+            return True
+        if char < " ":
+            return self._fail("control character in a string")
+        if self._is_key and len(self._stack) == 1:
+            self._string.append(char)
+        return True
+
+    def _open(self, bracket):
+        self._stack.append(bracket)
+        self._expect = _KEY_OR_END if bracket == "{" else _VALUE_OR_END
+
+    def _close(self, bracket):
+        self._stack.pop()
+        if not self._stack:
+            missing = self.required - self.keys
+            if missing:
+                return self._fail(f"object closed without {sorted(missing)}")
+            self._expect = _DONE
+            return True
+        self._value_done()
+        return True
+
+    def _value_done(self):
+        if not self._stack:
+            self._expect = _DONE
+        else:
+            self._expect = _OBJECT_NEXT if self._stack[-1] == "{" else _ARRAY_NEXT
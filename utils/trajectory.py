@@ -0,0 +1,104 @@
+import json
+
+BUTTONS = ["btn1", "btn2", "btn3", "btn4", "btn5", "btn6"]
+INVALID = "."  # Turn whose reply was rejected (format or choice error)
+
+# Version of the seeded episode generation (random draws, NPC order) a
+# trajectory was recorded with. Bump it whenever a change alters the episode
+# rebuilt from a seed and buttons, so replays of older records are refused.
+# 2: agents placed with rng.sample, exited NPCs swap-removed.
+FORMAT_VERSION = 2
+
+
+class Trajectory:
+    """
+    Compact record of an episode: its seed, its configuration and the button
+    chosen on every turn. Together with the seeded random streams of the
+    Simulation this is enough to rebuild the whole episode.
+    """
+
+    def __init__(
+        self,
+        seed,
+        config=None,
+        buttons=None,
+        outcome=None,
+        format_version=FORMAT_VERSION,
+    ):
+        """
+        Args:
+            seed (int): Episode seed.
+            config (dict): The game and screen configuration of the episode.
+            buttons (list): Button pressed on each turn, None for rejected replies.
+            outcome (str): Outcome of the episode, if known.
+            format_version (int): FORMAT_VERSION the episode was recorded with
+                (None for records older than the versioning).
+        """
+        self.seed = seed
+        self.config = config
+        self.buttons = buttons if buttons is not None else []
+        self.outcome = outcome
+        self.format_version = format_version
+
+    def __len__(self):
+        return len(self.buttons)
+
+    def append(self, button):
+        self.buttons.append(button)
+
+    def to_dict(self):
+        """
+        Encodes the buttons as a string with one character per turn ("1"-"6", "." for
+        errors).
+        """
+        buttons = "".join(
+            INVALID if button is None else button[-1] for button in self.buttons
+        )
+        return {
+            "format": self.format_version,
+            "seed": self.seed,
+            "config": self.config,
+            "buttons": buttons,
+            "outcome": self.outcome,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        buttons = [
+            None if char == INVALID else f"btn{char}" for char in data["buttons"]
+        ]
+        return cls(
+            data["seed"],
+            data.get("config"),
+            buttons,
+            data.get("outcome"),
+            data.get("format"),
+        )
+
+    def check_format(self):
+        """
+        Raises ValueError if the trajectory was recorded with another episode
+        generation than the current one, so replaying it would diverge.
+        """
+        if self.format_version != FORMAT_VERSION:
+            raise ValueError(
+                f"Trajectory of seed {self.seed} has format {self.format_version}, "
+                f"only format {FORMAT_VERSION} can be replayed"
+            )
+
+
+def save_trajectories(path, trajectories):
+    """
+    Appends trajectories to a JSONL file, one per line.
+    """
+    with open(path, "a", encoding="utf-8") as f:
+        for trajectory in trajectories:
+            f.write(json.dumps(trajectory.to_dict(), separators=(",", ":")) + "\n")
+
+
+def load_trajectories(path):
+    """
+    Reads all the trajectories of a JSONL file.
+    """
+    with open(path, encoding="utf-8") as f:
+        return [Trajectory.from_dict(json.loads(line)) for line in f if line.strip()]
@@ -0,0 +1,260 @@
+import json
+import os
+
+import numpy as np
+from utils.batch_env import ACTIONS
+from utils.batch_env import OUTCOMES as BATCH_OUTCOMES
+from utils.log_reader import EpisodeLog
+
+# Outcome codes of the store: the BatchSimulation ones, plus API errors
+OUTCOMES = BATCH_OUTCOMES + ("error",)
+ERRORS = (None, "format error", "choice error")
+NO_BUTTON = 0  # Button column of a rejected reply (buttons are stored as 1-6)
+
+EPISODE_DTYPE = np.dtype(
+    [
+        ("seed", "<u8"),
+        ("outcome", "u1"),
+        ("turns", "<u4"),
+        ("llm_control", "<u4"),
+        ("agents", "<u4"),
+        ("button_map", "u1", (6,)),  # Index in ACTIONS of the action of btn1..btn6
+        ("turn_start", "<u8"),  # First row of the episode in turns.bin
+        ("position_start", "<u8"),  # First row of the episode in positions.bin
+        ("prompt_tokens", "<u8"),
+        ("completion_tokens", "<u8"),
+    ]
+)
+
+TURN_DTYPE = np.dtype(
+    [
+        ("episode", "<u4"),
+        ("turn", "<u4"),
+        ("button", "u1"),
+        ("door_open", "u1"),
+        ("error", "u1"),
+        ("agents", "<u4"),  # Agents still in the grid, i.e. rows in positions.bin
+        ("text_offset", "<u8"),  # Reply text in text.bin
+        ("text_length", "<u4"),
+        ("prompt_tokens", "<u4"),
+        ("completion_tokens", "<u4"),
+    ]
+)
+
+POSITION_DTYPE = np.dtype(
+    [
+        ("episode", "<u4"),
+        ("turn", "<u4"),
+        ("agent", "<u4"),
+        ("x", "<u4"),
+        ("y", "<u4"),
+    ]
+)
+
+_TABLES = {"episodes": EPISODE_DTYPE, "turns": TURN_DTYPE, "positions": POSITION_DTYPE}
+
+
+class TrajectoryStore:
+    """
+    Append-only binary store of many episodes, in fixed-width NumPy records.
+
+    A store is a folder with one file per table: episodes.bin, turns.bin
+    (button, door state and error of each turn) and positions.bin (the
+    position of every agent at the start of each turn). The LLM replies are
+    kept apart in text.bin and only referenced by offset, plus the header
+    data that isn't numeric (model, config) in episodes.jsonl. The tables are
+    read through np.memmap, so outcome or position analysis over a whole
+    experiment never loads the reasoning strings.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Folder of the store. Created if it doesn't exist.
+        """
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _table(self, name):
+        """
+        Memory maps a table. Empty tables are returned as empty arrays (np.memmap
+        can't map an empty file).
+        """
+        dtype = _TABLES[name]
+        path = self._file(f"{name}.bin")
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r")
+
+    @property
+    def episodes(self):
+        return self._table("episodes")
+
+    @property
+    def turns(self):
+        return self._table("turns")
+
+    @property
+    def positions(self):
+        return self._table("positions")
+
+    def __len__(self):
+        return len(self.episodes)
+
+    def episode_turns(self, episode):
+        """
+        Returns the turn records of an episode (a view of the memory map).
+        """
+        record = self.episodes[episode]
+        start = int(record["turn_start"])
+        return self.turns[start : start + int(record["turns"])]
+
+    def episode_positions(self, episode):
+        """
+        Returns the position records of an episode (a view of the memory map).
+        """
+        episodes = self.episodes
+        start = int(episodes[episode]["position_start"])
+        end = (
+            int(episodes[episode + 1]["position_start"])
+            if episode + 1 < len(episodes)
+            else len(self.positions)
+        )
+        return self.positions[start:end]
+
+    def text(self, turn_row):
+        """
+        Returns the LLM reply of a row of the turns table.
+        """
+        record = self.turns[turn_row]
+        offset, length = int(record["text_offset"]), int(record["text_length"])
+        if length == 0:
+            return ""
+        data = np.memmap(
+            self._file("text.bin"), dtype="u1", mode="r", offset=offset, shape=(length,)
+        )
+        return data.tobytes().decode("utf-8")
+
+    def metadata(self, episode):
+        """
+        Returns the non-numeric header data of an episode (model, config).
+        """
+        with open(self._file("episodes.jsonl"), encoding="utf-8") as f:
+            for idx, line in enumerate(f):
+                if idx == episode:
+                    return json.loads(line)
+        raise IndexError(episode)
+
+    def append_log(self, log):
+        """
+        Converts an episode log (see JsonLogger) and appends it to the store.
+
+        Args:
+            log (EpisodeLog or str): The log, or its path.
+
+        Returns:
+            int: Index of the new episode.
+        """
+        if isinstance(log, str):
+            log = EpisodeLog(log)
+        header = log.header
+        episode = len(self)
+        turn_start = len(self.turns)
+        position_start = len(self.positions)
+        text_offset = self._size("text.bin")
+
+        turns, positions, texts = [], [], []
+        for view in log.turns():
+            text = (
+                view["llm"]
+                if isinstance(view["llm"], str)
+                else json.dumps(view["llm"], ensure_ascii=False)
+            )
+            text = text.encode("utf-8")
+            usage = view["usage"] or {}
+            turns.append(
+                (
+                    episode,
+                    view["turn"],
+                    int(view["choice"][-1]) if view["choice"] else NO_BUTTON,
+                    view["door_state"] == "open",
+                    ERRORS.index(view["error"]),
+                    len(view["agents_positions"]),
+                    text_offset,
+                    len(text),
+                    usage.get("prompt_tokens", 0),
+                    usage.get("completion_tokens", 0),
+                )
+            )
+            positions.extend(
+                (episode, view["turn"], agent["id"], agent["x"], agent["y"])
+                for agent in view["agents_positions"]
+            )
+            texts.append(text)
+            text_offset += len(text)
+
+        end = log.end() or {}
+        tokens = end.get("tokens") or {}
+        button_map = header["button_map"]
+        episode_record = (
+            header.get("seed") or 0,
+            OUTCOMES.index(end.get("outcome")),
+            len(turns),
+            header["LLM_control"],
+            len(header["agents"]),
+            [ACTIONS.index(button_map[f"btn{idx}"]) for idx in range(1, 7)],
+            turn_start,
+            position_start,
+            tokens.get("prompt_tokens", 0),
+            tokens.get("completion_tokens", 0),
+        )
+
+        # Side tables first, so a crash never leaves an episode pointing past their end
+        with open(self._file("text.bin"), "ab") as f:
+            f.write(b"".join(texts))
+        with open(self._file("episodes.jsonl"), "a", encoding="utf-8") as f:
+            meta = {
+                "model": header.get("model"),
+                "config": header.get("config"),
+                "log": log.path,
+            }
+            f.write(json.dumps(meta, separators=(",", ":")) + "\n")
+        self._write("positions", positions)
+        self._write("turns", turns)
+        self._write("episodes", [episode_record])
+        return episode
+
+    def _size(self, name):
+        path = self._file(name)
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    def _write(self, name, rows):
+        with open(self._file(f"{name}.bin"), "ab") as f:
+            f.write(np.array(rows, dtype=_TABLES[name]).tobytes())
+
+
+def outcome_counts(store):
+    """
+    Counts the episodes of each outcome, reading only the episodes table.
+    """
+    codes = np.bincount(store.episodes["outcome"], minlength=len(OUTCOMES))
+    return {outcome: int(count) for outcome, count in zip(OUTCOMES, codes) if count}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Convert episode logs to a binary trajectory store."
+    )
+    parser.add_argument("store", help="store folder")
+    parser.add_argument("logs", nargs="*", help="episode logs (JSONL) to append")
+    args = parser.parse_args()
+
+    store = TrajectoryStore(args.store)
+    for path in args.logs:
+        store.append_log(path)
+    print(f"{len(store)} episodes, {len(store.turns)} turns:", outcome_counts(store))